@@ -2,10 +2,10 @@
 
 
 # Lib
-from asyncio import sleep
 from importlib import import_module
 from os import getcwd, popen
-from os.path import split
+from os.path import exists, split
+from time import strftime
 
 # Site
 from discord.abc import Messageable
@@ -22,12 +22,14 @@ from discord.ext.commands.errors import (
     ExtensionNotLoaded,
     NoEntryPointError,
 )
+from discord.user import User
 from discord.utils import oauth_url
 from utils.classes import Embed
 
 # Local
-from utils.checks import sudo
-from utils.classes import Bot, SubRedis, GlobalTextChannelConverter
+from utils.backup import dump, restore
+from utils.checks import owner, sudo
+from utils.classes import AsyncSubRedis, Bot, CircuitBreaker, GlobalTextChannelConverter, RedisCache
 
 
 class Admin(Cog):
@@ -36,8 +38,8 @@ class Admin(Cog):
     def __init__(self, bot: Bot):
         self.bot = bot
 
-        self.config = SubRedis(bot.db, "admin")
-        self.config_bot = SubRedis(bot.db, "config")
+        self.config = AsyncSubRedis(bot.db, "admin", cache=RedisCache(maxsize=256, ttl=300))
+        self.config_bot = AsyncSubRedis(bot.db, "config")
 
         self.errorlog = bot.errorlog
 
@@ -304,7 +306,7 @@ class Admin(Cog):
         modules = dict()
         failed = dict()
 
-        for init_module in self.config_bot.smembers('initial_cogs'):
+        for init_module in await self.config_bot.smembers('initial_cogs'):
             try:
                 module = import_module(f"cogs.{init_module}")
                 module_setup = getattr(module, "setup")
@@ -341,8 +343,7 @@ class Admin(Cog):
         lib = None
         module_setup = None
 
-        init_modules = self.config_bot.smembers("initial_cogs")
-        if module in init_modules:
+        if await self.config_bot.sismember("initial_cogs", module):
             em = Embed(
                 title="Administration: Initial Module Add Failed",
                 description=f"**__ExtensionAlreadyLoaded__**\n"
@@ -390,12 +391,20 @@ class Admin(Cog):
             verbose_error = error
 
         else:
-            self.config_bot.sadd("initial_cogs", module)
-            em = Embed(
-                title="Administration: Initial Module Add",
-                description=f"Module `{module}` added to initial modules",
-                color=0x00FF00
-            )
+            # SADD replies 0 if another process added it since the check above
+            if await self.config_bot.sadd("initial_cogs", module):
+                em = Embed(
+                    title="Administration: Initial Module Add",
+                    description=f"Module `{module}` added to initial modules",
+                    color=0x00FF00
+                )
+            else:
+                em = Embed(
+                    title="Administration: Initial Module Add Failed",
+                    description=f"**__ExtensionAlreadyLoaded__**\n"
+                                f"Module `{module}` is already initial module",
+                    color=0xFF0000
+                )
             await ctx.send(embed=em, delete_after=self.delete_after)
 
         finally:
@@ -411,11 +420,8 @@ class Admin(Cog):
     async def rem(self, ctx: Context, module: str):
         """Removes a module from initial modules"""
 
-        # Get current list of initial cogs
-        init_modules = self.config_bot.smembers("initial_cogs")
-
-        if module in init_modules:
-            self.config_bot.srem("initial_cogs", module)
+        # SREM replies with the number removed, so there is no need to read first
+        if await self.config_bot.srem("initial_cogs", module):
             em = Embed(
                 title="Administration: Initial Module Remove",
                 description=f"Module `{module}` removed from initial modules",
@@ -689,8 +695,10 @@ class Admin(Cog):
 
         `Displays current prefix settings"""
 
+        prefixes = self.bot.prefixes
+
         if ctx.guild:
-            guild_prefix = self.config_bot.hget("prefix:guild", ctx.guild.id)
+            guild_prefix = prefixes.guilds.get(ctx.guild.id)
 
             if guild_prefix:
                 guild_prefix = f"`{guild_prefix}`"
@@ -707,13 +715,13 @@ class Admin(Cog):
 
         em.add_field(
             name="Default Prefix:",
-            value=f"`{self.config_bot.hget('prefix:config', 'default_prefix')}`",
+            value=f"`{prefixes.default_prefix}`",
             inline=False
         )
 
         em.add_field(
             name="When Mentioned:",
-            value=f"`{self.config_bot.hget('prefix:config', 'when_mentioned')}`",
+            value=f"`{prefixes.when_mentioned}`",
             inline=False
         )
 
@@ -732,7 +740,7 @@ class Admin(Cog):
         """Show or change default prefix"""
 
         if prefix:
-            self.config_bot.hset("prefix:config", "default_prefix", prefix)
+            await self.bot.prefixes.set_default(prefix)
             em = Embed(
                 title="Administration: Default Prefix",
                 description=f"Default prefix changed to `{prefix}`",
@@ -740,7 +748,7 @@ class Admin(Cog):
             )
 
         else:
-            default_prefix = self.config_bot.hget("prefix:config", "default_prefix")
+            default_prefix = self.bot.prefixes.default_prefix
             em = Embed(
                 title="Administration: Default Prefix",
                 description=f"Default prefix currently set to `{default_prefix}`",
@@ -757,10 +765,8 @@ class Admin(Cog):
         `[p]prefix mention` to toggle current setting
         `[p]prefix mention [True|False]` to set setting"""
 
-        if enabled is None:
-            enabled = not self.config_bot.hget("prefix:config", "when_mentioned")
-
-        self.config_bot.hset("prefix:config", "when_mentioned", str(enabled))
+        # Toggled from the stored value, in case another process changed it
+        enabled = await self.bot.prefixes.set_mention(enabled)
 
         em = Embed(
             title="Administration: Mention As Prefix",
@@ -775,10 +781,11 @@ class Admin(Cog):
     async def guild(self, ctx: Context, *, prefix: str = None):
         """Change guild-specific prefix"""
 
-        current_guild_prefix = self.config_bot.hget("prefix:guild", f"{ctx.guild.id}")
+        # Set and previous value read in one atomic round trip
+        previous = await self.bot.prefixes.set_guild(ctx.guild.id, prefix)
 
         if prefix:
-            if current_guild_prefix == prefix:
+            if previous == prefix:
                 em = Embed(
                     title="Administration: Guild-Specific Prefix",
                     description=f"No changes to make.\n"
@@ -787,7 +794,6 @@ class Admin(Cog):
                 )
 
             else:
-                self.config_bot.hset("prefix:guild", f"{ctx.guild.id}", prefix)
                 em = Embed(
                     title="Administration: Guild-Specific Prefix",
                     description=f"Prefix for guild `{ctx.guild.name}` set to `{prefix}`",
@@ -795,7 +801,6 @@ class Admin(Cog):
                 )
 
         else:
-            self.config_bot.hdel("prefix:guild", f"{ctx.guild.id}")
             em = Embed(
                 title="Administration: Guild-Specific Prefix",
                 description=f"Prefix for guild `{ctx.guild.name}` unset",
@@ -804,6 +809,232 @@ class Admin(Cog):
 
         await ctx.send(embed=em, delete_after=self.delete_after)
 
+    """ ##########
+         Sudoers
+        ########## """
+
+    @owner()
+    @config.group(name="sudoers", aliases=["sudo"], invoke_without_command=True)
+    async def sudoers(self, ctx: Context):
+        """List users allowed to use sudo commands"""
+
+        users = "\n".join([
+            f"{self.bot.get_user(user_id) or 'Unknown user'} ({user_id})" for user_id in self.bot.permissions.sudoers
+        ]) or "No sudoers set"
+
+        em = Embed(
+            title="Administration: Sudoers",
+            description=users,
+            color=self.color(ctx)
+        )
+
+        await ctx.send(embed=em, delete_after=self.delete_after)
+
+    @owner()
+    @sudoers.command(name="add")
+    async def sudoers_add(self, ctx: Context, user: User):
+        """Allow a user to use sudo commands"""
+
+        if await self.bot.permissions.add_sudoer(user.id):
+            em = Embed(
+                title="Administration: Sudoers",
+                description=f"{user.mention} added to sudoers",
+                color=0x00FF00
+            )
+        else:
+            em = Embed(
+                title="Administration: Sudoers",
+                description=f"{user.mention} is already a sudoer",
+                color=self.color(ctx)
+            )
+
+        await ctx.send(embed=em, delete_after=self.delete_after)
+
+    @owner()
+    @sudoers.command(name="rem", aliases=["del", "delete", "remove"])
+    async def sudoers_rem(self, ctx: Context, user: User):
+        """Revoke a user's sudo"""
+
+        if await self.bot.permissions.remove_sudoer(user.id):
+            em = Embed(
+                title="Administration: Sudoers",
+                description=f"{user.mention} removed from sudoers",
+                color=0x00FF00
+            )
+        else:
+            em = Embed(
+                title="Administration: Sudoers",
+                description=f"{user.mention} is not a sudoer",
+                color=self.color(ctx)
+            )
+
+        await ctx.send(embed=em, delete_after=self.delete_after)
+
+    """ ###################
+         Database Backups
+        ################### """
+
+    @sudo()
+    @group(name="db", invoke_without_command=True)
+    async def db(self, ctx: Context):
+        """Dump or restore the bot's Redis keyspace"""
+        await self.bot.send_help_for(ctx, self.bot.get_command("db"))
+
+    @sudo()
+    @db.command(name="dump", aliases=["backup"])
+    async def db_dump(self, ctx: Context, file: str = None):
+        """Dump the bot's namespace to a gzipped file
+
+        Defaults to `{APP_NAME}-{timestamp}.jsonl.gz` in the working directory"""
+
+        file = file or f"{self.bot.APP_NAME}-{strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+
+        # Bulk transfers can outlast the circuit breaker's timeout
+        async with ctx.typing():
+            with CircuitBreaker.bypass():
+                total = await dump(self.bot.db.root, file, match=f"{self.bot.db.basekey}:*")
+
+        em = Embed(
+            title="Administration: Database Dump",
+            description=f"Dumped `{total}` keys to `{file}`",
+            color=0x00FF00
+        )
+        await ctx.send(embed=em, delete_after=self.delete_after)
+
+    @sudo()
+    @db.command(name="restore", usage="(file)")
+    async def db_restore(self, ctx: Context, file: str):
+        """Restore a dump file into the database
+
+        Existing keys in the dump are replaced"""
+
+        if not exists(file):
+            em = Embed(
+                title="Administration: Database Restore Failed",
+                description=f"No dump file `{file}` found",
+                color=0xFF0000
+            )
+            await ctx.send(embed=em, delete_after=self.delete_after)
+            return
+
+        async with ctx.typing():
+            with CircuitBreaker.bypass():
+                total = await restore(self.bot.db.root, file)
+
+        # The restore wrote around SubRedis, so nothing cached is current.
+        # Cleared first so the in-memory copies reload from Redis
+        for cache in self.bot.db.root.caches.values():
+            cache.clear()
+
+        await self.bot.prefixes.reload()
+        await self.bot.permissions.reload()
+
+        em = Embed(
+            title="Administration: Database Restore",
+            description=f"Restored `{total}` keys from `{file}`",
+            color=0x00FF00
+        )
+        await ctx.send(embed=em, delete_after=self.delete_after)
+
+    @sudo()
+    @db.group(name="stats", invoke_without_command=True)
+    async def db_stats(self, ctx: Context, top: int = 10):
+        """Redis command latencies, hottest keys, cache hit rates and coalesced reads"""
+
+        stats = self.bot.db.root.stats
+        summary = stats.summary()
+
+        commands = "\n".join([
+            f"{command:<10} {s['count']:>8} {s['mean'] * 1000:>8.2f} {s['p50'] * 1000:>8.2f} {s['p99'] * 1000:>8.2f}"
+            for command, s in list(summary.items())[:top]
+        ]) or "No commands recorded"
+
+        keys = "\n".join([f"{count:>8} {key}" for key, count in stats.top(n=top)]) or "No keys recorded"
+
+        caches = "\n".join([
+            f"{ns}: {info['hits']} hits, {info['misses']} misses, {info['hit_rate']:.1%}, {info['size']}/{info['maxsize']}"
+            for ns, info in ((ns, cache.info()) for ns, cache in self.bot.db.root.caches.items())
+        ]) or "No caches registered"
+
+        em = Embed(
+            title="Administration: Redis Stats",
+            color=0x00FF00
+        )
+        em.add_field(
+            name="Commands (ms)",
+            value=f"```\n{'command':<10} {'count':>8} {'mean':>8} {'p50':>8} {'p99':>8}\n{commands}\n```",
+            inline=False
+        )
+        em.add_field(
+            name="Hot Keys",
+            value=f"```\n{keys}\n```",
+            inline=False
+        )
+        em.add_field(
+            name="Caches",
+            value=f"```\n{caches}\n```",
+            inline=False
+        )
+        em.add_field(
+            name="Coalesced Reads",
+            value=f"{stats.coalesced} commands saved",
+            inline=False
+        )
+
+        await self.bot.outbox.send(ctx, embeds=em.split())
+
+    @sudo()
+    @db_stats.command(name="reset")
+    async def db_stats_reset(self, ctx: Context):
+        """Clear the recorded Redis stats"""
+
+        self.bot.db.root.stats.reset()
+
+        em = Embed(
+            title="Administration: Redis Stats",
+            description="Recorded stats cleared",
+            color=0x00FF00
+        )
+        await ctx.send(embed=em, delete_after=self.delete_after)
+
+    """ ##################
+         Error Statistics
+        ################## """
+
+    @sudo()
+    @command(name="errors")
+    async def errors(self, ctx: Context, top: int = 10):
+        """Most raised errors, by traceback fingerprint"""
+
+        errorlog = self.bot.errorlog
+
+        if not errorlog or errorlog.db is None:
+            em = Embed(
+                title="Administration: Error Statistics",
+                description="Error statistics are not being recorded",
+                color=0xFF0000
+            )
+            return await ctx.send(embed=em, delete_after=self.delete_after)
+
+        em = Embed(
+            title="Administration: Error Statistics",
+            color=0x00FF00
+        )
+
+        for fingerprint, count, stat in await errorlog.top(top):
+            em.add_field(
+                name=f"`{fingerprint}` {stat.get('type', 'Unknown')}: {count} time{'s' if count != 1 else ''}",
+                value=f"{stat.get('location') or 'Unknown location'}\n"
+                      f"Last in {stat.get('context', 'unknown')} <t:{stat.get('last_seen', 0)}:R>, "
+                      f"first <t:{stat.get('first_seen', 0)}:R>",
+                inline=False
+            )
+
+        if not em.fields:
+            em.description = "No errors recorded"
+
+        await self.bot.outbox.send(ctx, embeds=em.split())
+
     """ #########################
          Updating and Restarting
         ######################### """
@@ -902,9 +1133,8 @@ class Admin(Cog):
             inline=False
         )
 
-        for embed in em.split():
-            await ctx.send(embed=embed)
-            await sleep(0.1)
+        embeds, file = em.overflow(filename="tail.txt")
+        await self.bot.outbox.send(ctx, embeds=embeds, file=file)
 
     @sudo()
     @tail.command(name="out")
@@ -923,9 +1153,8 @@ class Admin(Cog):
             inline=False
         )
 
-        for embed in em.split():
-            await ctx.send(embed=embed)
-            await sleep(0.1)
+        embeds, file = em.overflow(filename="tail.txt")
+        await self.bot.outbox.send(ctx, embeds=embeds, file=file)
 
     @sudo()
     @tail.command(name="err", aliases=["error"])
@@ -944,9 +1173,8 @@ class Admin(Cog):
             inline=False
         )
 
-        for embed in em.split():
-            await ctx.send(embed=embed)
-            await sleep(0.1)
+        embeds, file = em.overflow(filename="tail.txt")
+        await self.bot.outbox.send(ctx, embeds=embeds, file=file)
 
 
 def setup(bot: Bot):
@@ -23,8 +23,8 @@ from pytz import timezone
 from typing import Union
 
 # Local
-from utils.classes import Bot, Embed, SubRedis
-from utils.errors import UnimplementedError
+from utils.classes import AsyncSubRedis, Bot, Embed, RedisCache, WebhookTransport
+from utils.errors import CircuitOpenError, UnimplementedError
 
 
 WELCOME = "**Welcome to AWBW Discord Server {}!**\nPresent yourself and have fun!"
@@ -38,7 +38,7 @@ class Events(Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.config = SubRedis(bot.db, "events")
+        self.config = AsyncSubRedis(bot.db, "events", cache=RedisCache(maxsize=256, ttl=300))
 
         self.errorlog = bot.errorlog
 
@@ -46,6 +46,9 @@ class Events(Cog):
         # self.channel = bot.get_channel(313453805150928906)          # AWBW General
         self.notifchannel = bot.get_channel(815627325936631848)     # SESTREN-Notifs
 
+        # Mention notifications go through a webhook instead, if one is configured
+        self.notifications = WebhookTransport(bot, bot.notifications_webhook) if bot.notifications_webhook else None
+
     # @Cog.listener(name="on_member_join")
     # async def on_member_join(self, member: Member):
     #     """Welcome Message"""
@@ -131,6 +134,16 @@ class Events(Cog):
             )
             await ctx.send(embed=em)
 
+        elif isinstance(error, CommandInvokeError) and isinstance(error.original, CircuitOpenError):
+            em = Embed(
+                color=ctx.guild.me.colour if ctx.guild else Embed.Empty,
+                title="Command Error",
+                description="```\n"
+                            "The database is unreachable. Nothing was changed, try again later.\n"
+                            "```"
+            )
+            await ctx.send(embed=em)
+
         elif isinstance(error, CommandInvokeError):
             await self.errorlog.send(error.original, ctx)
 
@@ -150,9 +163,13 @@ class Events(Cog):
             )
             em.set_author(
                 name=f"{author.name}#{author.discriminator}{display_name}",
-                icon_url=author.avatar_url_as(format="png")
+                icon_url=author.display_avatar.with_format("png").url
             )
-            await self.notifchannel.send(msg.jump_url, embed=em)
+
+            if self.notifications:
+                await self.notifications.send(msg.jump_url, embeds=[em])
+            else:
+                await self.notifchannel.send(msg.jump_url, embed=em)
 
 
 def setup(bot: Bot):
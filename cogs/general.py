@@ -16,7 +16,7 @@ from discord.utils import find
 
 # Local
 from utils.checks import sudo
-from utils.classes import Bot, Embed, SubRedis
+from utils.classes import AsyncSubRedis, Bot, Embed, RedisCache
 
 
 class General(Cog):
@@ -24,7 +24,7 @@ class General(Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.config = SubRedis(bot.db, "general")
+        self.config = AsyncSubRedis(bot.db, "general", cache=RedisCache(maxsize=256, ttl=300))
 
         self.errorlog = bot.errorlog
 
@@ -5,7 +5,6 @@
 
 
 # Lib
-from asyncio.tasks import sleep
 from inspect import isawaitable
 
 # Site
@@ -15,7 +14,7 @@ from discord.ext.commands.context import Context
 from discord.ext.commands.core import command, group
 
 # Local
-from utils.classes import Bot, Embed, SubRedis
+from utils.classes import AsyncSubRedis, Bot, Embed
 from utils.checks import sudo
 from utils.utils import stdoutio
 
@@ -28,7 +27,7 @@ class REPL(Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.config = SubRedis(bot.db, "REPL")
+        self.config = AsyncSubRedis(bot.db, "REPL")
 
         self.errorlog = bot.errorlog
 
@@ -131,9 +130,8 @@ class REPL(Cog):
             em = Embed(title='Eval on', desc=MD.format(code), color=0xFF0000)
             em.add_field(name=f"Exception: {type(e).__name__}", value=f"`{e}`", inline=False)
 
-        for page in em.split():
-            await ctx.send(embed=page)
-            await sleep(0.1)
+        embeds, file = em.overflow()
+        await self.bot.outbox.send(ctx, embeds=embeds, file=file)
 
     @sudo()
     @command(name='exec')
@@ -170,9 +168,8 @@ class REPL(Cog):
                 inline=False
             )
 
-        for embed in em.split():
-            await ctx.send(embed=embed)
-            await sleep(0.1)
+        embeds, file = em.overflow()
+        await self.bot.outbox.send(ctx, embeds=embeds, file=file)
 
 
 def setup(bot: Bot) -> None:
@@ -16,14 +16,14 @@ from discord.ext.commands.core import group, command
 
 # Local
 from utils.checks import sudo
-from utils.classes import Bot, Embed, Paginator, SubRedis
+from utils.classes import AsyncSubRedis, Bot, Embed, Paginator
 
 
 class Test(Cog):
 
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.config = SubRedis(bot.db, "test")
+        self.config = AsyncSubRedis(bot.db, "test")
 
         self.errorlog = bot.errorlog
 
@@ -104,7 +104,7 @@ Quis autem vel eum iure reprehenderit qui in ea voluptate velit esse quam nihil
     @command(name='redtest')
     async def redtest(self, ctx: Context, *, message: str):
         """Test docstr"""
-        self.config.hset('redtest', ctx.message.id, message)
+        await self.config.hset('redtest', ctx.message.id, message)
 
     @sudo()
     @command(name="embtest")
@@ -3,19 +3,22 @@
 """SESTREN"""
 
 # Lib
+from functools import partial
 from json import load
-from typing import List
 
 # Site
 from discord.activity import Activity
-from discord.channel import TextChannel
-from discord.ext.commands import when_mentioned
 from discord.flags import Intents
 from discord.message import Message
 from discord.utils import oauth_url
+from redis.asyncio.sentinel import Sentinel as AsyncSentinel
+from redis.sentinel import Sentinel
 
 # Local
-from utils.classes import Bot, ErrorLog, Redis, SubRedis
+from utils.classes import AsyncRedis, AsyncRedisCluster, AsyncReplicaReader, AsyncSubRedis, Bot, CircuitBreaker, ErrorLog, \
+    PermissionIndex, PrefixResolver, Redis, RedisCache, RedisCluster, RedisSchema, RedisSnapshot, ReplicaReader, SubRedis, \
+    WebhookTransport
+from utils.memory import AsyncMemoryRedis, MemoryRedis, MemoryStore
 
 
 APP_NAME = "SESTREN"  # BOT NAME HERE
@@ -29,12 +32,26 @@ Minimum Redis Schema
         :key description:       str         # Description will be used for Help
         :key dm_help:           bool        # If Help output will be forced to DMs
         :key errorlog:          int         # Channel ID for errorlog channel
+        :key errorlog_webhook:  str         # Webhook URL to send errorlog reports through, optional
+        :key notifications_webhook: str     # Webhook URL to send mention notifications through, optional
     :HASH {APP_NAME}:config:run
         :key bot:               bool        # If bot account
         :key token:             str         # Login token
     :HASH {APP_NAME}:config:prefix:config
         :key default_prefix:    str         # Default bot prefix
         :key when_mentioned:    bool        # Whether bot mentions count as prefix
+    :SET {APP_NAME}:config:permissions:sudoers
+        :member                 int         # User ID allowed to use sudo commands
+
+:namespace {APP_NAME}:errors:
+    :ZSET {APP_NAME}:errors:counts
+        :member                 str         # Traceback fingerprint, scored by times raised
+    :HASH {APP_NAME}:errors:fingerprint:{fingerprint}
+        :key type:              str         # Exception class
+        :key location:          str         # File, line and function it was raised from
+        :key context:           str         # Command or event it was last raised in
+        :key first_seen:        int         # Unix timestamps
+        :key last_seen:         int
 
 
 Redis Configuration JSON Schema
@@ -44,57 +61,145 @@ Redis Configuration JSON Schema
   "host": "localhost",                      # Server address hosting Redis DB
   "port": 6379,                             # Port for accessing Redis
   "db": 0,                                  # Redis DB number storing app configs
-  "decode_responses": true                  # decode_responses must be bool true
+  "decode_responses": true,                 # decode_responses must be bool true
+  "backend": "redis",                       # "cluster" for a Redis Cluster, "memory" to run without a server
+  "path": "SESTREN.aof",                    # Persistence file for the memory backend
+  "fsync_interval": 1.0,                    # Seconds between memory backend flushes
+  "socket_timeout": 2.0,                    # Seconds before a blocking call fails
+  "timeout": 0.5,                           # Seconds before an asyncio call counts as failed
+  "snapshot": "SESTREN.snapshot.json",      # Last known config values, served while Redis is down
+  "replicas": [                             # Read replicas of the server above, optional
+    {"host": "localhost", "port": 6380}
+  ],
+  "sentinel": {                             # Sentinel group, optional, used instead of host and port
+    "hosts": [["localhost", 26379]],
+    "service": "mymaster"
+  }
 }
 """
 
 
+# Declared types of the minimum schema. Replies are decoded by this,
+# anything undeclared is returned as it is stored
+schema = RedisSchema({
+    f"{APP_NAME}:config:instance": {"description": str, "dm_help": bool, "errorlog": int},
+    f"{APP_NAME}:config:run": {"bot": bool, "token": str},
+    f"{APP_NAME}:config:prefix:config": {"default_prefix": str, "when_mentioned": bool},
+    f"{APP_NAME}:config:prefix:guild": {"*": str},
+    f"{APP_NAME}:errors:fingerprint:*": {"first_seen": int, "last_seen": int},
+})
+
+
 try:
     with open("redis.json", "r+") as redis_conf:
         conf = load(redis_conf)
-        db = SubRedis(Redis(**conf), APP_NAME)
-        config = SubRedis(db, "config")
 
 except FileNotFoundError:
     raise FileNotFoundError("redis.json not found in running directory")
 
+backend = conf.pop("backend", "redis")
+
+# Reads go to the primary unless replicas are configured
+sync_reader = None
+async_reader = None
+
+memory_conf = {key: conf.pop(key) for key in ("path", "fsync_interval") if key in conf}
+breaker_conf = {key: conf.pop(key) for key in ("snapshot", "timeout") if key in conf}
+
+# While the primary is unreachable, config reads are served from the last
+# values seen and writes are queued, instead of every message stalling
+snapshot = RedisSnapshot(breaker_conf.get("snapshot", f"{APP_NAME}.snapshot.json"), match=(f"{APP_NAME}:config:*",))
+breaker = CircuitBreaker(snapshot, timeout=breaker_conf.get("timeout", 0.5))
+
+if backend == "memory":
+    # Both clients share one in-process keyspace, persisted to a local file
+    store = MemoryStore(**memory_conf)
+    sync_client = MemoryRedis(store, schema=schema)
+    async_client = AsyncMemoryRedis(store, schema=schema)
+
+elif backend == "cluster":
+    # host and port are any one node, the rest are discovered. Clusters have no db number
+    conf.pop("db", None)
+    sync_client = RedisCluster(schema=schema, breaker=breaker, **conf)
+    async_client = AsyncRedisCluster(schema=schema, breaker=breaker, **conf)
+
+else:
+    replicas = conf.pop("replicas", list())
+    sentinel = conf.pop("sentinel", None)
 
-if not config.hget("instance", "description"):
-    config.hset("instance", "description", "")
+    if sentinel:
+        # Primary and replica addresses come from Sentinel and follow failovers
+        conf.pop("host", None)
+        conf.pop("port", None)
+        sync_sentinel = Sentinel(sentinel["hosts"], **conf)
+        async_sentinel = AsyncSentinel(sentinel["hosts"], **conf)
 
-if not config.hget("instance", "dm_help"):
-    config.hset("instance", "dm_help", "True")
+        sync_client = sync_sentinel.master_for(sentinel["service"], redis_class=partial(Redis, schema=schema, breaker=breaker))
+        async_client = async_sentinel.master_for(
+            sentinel["service"], redis_class=partial(AsyncRedis, schema=schema, breaker=breaker)
+        )
 
-if not config.hget("prefix:config", "default_prefix"):
-    config.hset("prefix:config", "default_prefix", "!")
+        # Balances over the replicas Sentinel knows of, or the primary if there are none
+        sync_replicas = [sync_sentinel.slave_for(sentinel["service"], redis_class=partial(Redis, schema=schema))]
+        async_replicas = [async_sentinel.slave_for(sentinel["service"], redis_class=partial(AsyncRedis, schema=schema))]
 
-if not config.hget("prefix:config", "when_mentioned"):
-    config.hset("prefix:config", "when_mentioned", "False")
+    else:
+        sync_client = Redis(schema=schema, breaker=breaker, **conf)
+        async_client = AsyncRedis(schema=schema, breaker=breaker, **conf)
 
+        sync_replicas = [Redis(schema=schema, **{**conf, **replica}) for replica in replicas]
+        async_replicas = [AsyncRedis(schema=schema, **{**conf, **replica}) for replica in replicas]
 
-def command_prefix(client: Bot, msg: Message) -> List[str]:
-    """Callable to determine guild-specific prefix or default"""
+    if sync_replicas:
+        sync_reader = ReplicaReader(sync_client, sync_replicas)
+        async_reader = AsyncReplicaReader(async_client, async_replicas)
 
-    # Get default prefix and whether mentions count
-    prefix_config = config.hgetall("prefix:config")
+# Blocking client, only used for startup before the event loop runs
+db = SubRedis(sync_client, APP_NAME, reader=sync_reader)
+config = SubRedis(db, "config")
 
-    prefix = [prefix_config["default_prefix"]]
-    if prefix_config["when_mentioned"]:
-        prefix.extend(when_mentioned(client, msg))
+# asyncio client used by the bot, checks and cogs once running
+# Config rarely changes, so reads are served from a local cache
+async_db = AsyncSubRedis(async_client, APP_NAME, reader=async_reader)
+async_config = AsyncSubRedis(async_db, "config", cache=RedisCache(maxsize=1024, ttl=300))
 
-    # If in a guild, check for guild-specific prefix
-    if isinstance(msg.channel, TextChannel):
-        guild_prefix = config.hget("prefix:guild", msg.channel.guild.id)
-        if guild_prefix:
-            prefix.append(guild_prefix)
 
-    return prefix
+# Defaults for the minimum schema, set only where a field is missing
+defaults = [
+    ("instance", "description", ""),
+    ("instance", "dm_help", "True"),
+    ("prefix:config", "default_prefix", "!"),
+    ("prefix:config", "when_mentioned", "False"),
+]
+
+# Fill in missing defaults, then read back everything needed at startup.
+# HSETNX only writes absent fields, and MULTI/EXEC keeps another process
+# from seeing a half-initialized config
+with config.batch(transaction=True) as startup:
+    for name, key, value in defaults:
+        startup.hsetnx(name, key, value)
+
+    startup.hgetall("prefix:config")
+    startup.hgetall("prefix:guild")
+    startup.hgetall("instance")
+    startup.smembers("permissions:sudoers")
+
+prefix_config, guild_prefixes, instance_config, sudoers = startup.results[-4:]
+
+
+# Prefixes are resolved from memory. Admin prefix commands write through it
+prefixes = PrefixResolver(async_config)
+prefixes.load(prefix_config, guild_prefixes)
+
+# Sudoers are checked from memory. Admin sudoers commands write through it
+permissions = PermissionIndex(async_config)
+permissions.load(sudoers)
 
 
 intents = Intents.all()
 
 
-bot = Bot(db=db, app_name=APP_NAME, command_prefix=command_prefix, intents=intents, **config.hgetall("instance"))
+bot = Bot(db=async_db, app_name=APP_NAME, prefixes=prefixes, permissions=permissions, intents=intents, **instance_config)
 
 
 @bot.event
@@ -109,14 +214,19 @@ async def on_ready():
     bot.app_info = await bot.application_info()
     bot.owner = bot.get_user(bot.app_info.owner.id)
 
-    # Add the ErrorLog object if the channel is specified
-    if bot.errorlog_channel:
-        bot.errorlog = ErrorLog(bot, bot.errorlog_channel)
+    # Add the ErrorLog object if the channel or a webhook is specified
+    if bot.errorlog_channel or bot.errorlog_webhook:
+        bot.errorlog = ErrorLog(
+            bot,
+            bot.errorlog_channel,
+            db=AsyncSubRedis(async_db, "errors"),
+            webhook=WebhookTransport(bot, bot.errorlog_webhook) if bot.errorlog_webhook else None
+        )
 
     print(f"\n#-------------------------------#")
 
     # Load all initial cog names stored in db
-    for cog in config.lrange("initial_cogs", 0, -1):
+    for cog in await async_config.lrange("initial_cogs", 0, -1):
         try:
             print(f"| Loading initial cog {cog}")
             bot.load_extension(f"cogs.{cog}")
@@ -124,7 +234,7 @@ async def on_ready():
             print(f"| Failed to load extension {cog}\n|   {type(e).__name__}: {e}")
 
     # "Ready" status message
-    ready = f"{config.hget('prefix:config', 'default_prefix')}help for help"
+    ready = f"{prefixes.default_prefix}help for help"
     await bot.change_presence(activity=Activity(name=ready, type=2))
 
     # Pretty printing ready message and general stats
@@ -142,6 +252,11 @@ async def on_ready():
 
 @bot.event
 async def on_message(msg: Message):
+
+    # Most messages are not commands. Skip them before discord.py parses them
+    if not prefixes.could_match(msg):
+        return
+
     await bot.process_commands(msg)
 
 
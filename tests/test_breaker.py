@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+
+# Lib
+from asyncio import run
+
+# Site
+from pytest import fixture, importorskip, raises
+from redis import ConnectionPool
+from redis.asyncio import ConnectionPool as AsyncConnectionPool
+from redis.exceptions import ResponseError
+
+# Local
+from utils.classes import (
+    AsyncRedis,
+    AsyncSubRedis,
+    CircuitBreaker,
+    PermissionIndex,
+    PrefixResolver,
+    Redis,
+    RedisCache,
+    RedisScript,
+    RedisSnapshot,
+    ReplicaReader,
+    SubRedis
+)
+from utils.errors import CircuitOpenError
+
+fakeredis = importorskip("fakeredis")
+
+
+"""
+    CircuitBreaker, run through clients it is attached to, on fakeredis.
+"""
+
+
+@fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@fixture
+def breaker():
+    return CircuitBreaker(RedisSnapshot(), timeout=1.0, threshold=2, backoff=0.05)
+
+
+@fixture
+def client(server, breaker):
+    pool = ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=server, decode_responses=True)
+    return Redis(breaker=breaker, connection_pool=pool)
+
+
+@fixture
+def async_client(server, breaker):
+    pool = AsyncConnectionPool(connection_class=fakeredis.FakeAsyncRedisConnection, server=server, decode_responses=True)
+    return AsyncRedis(breaker=breaker, connection_pool=pool)
+
+
+def fill(client: Redis, n: int = 50) -> None:
+    for i in range(n):
+        client.set(f"A:key:{i}", str(i))
+    client.hset("A:hash", "field", "value")
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    """Open the circuit, as consecutive failures would"""
+    for _ in range(breaker.threshold):
+        breaker._failure()
+    assert breaker.state == "open"
+
+
+def retry(breaker: CircuitBreaker) -> None:
+    """Let the next call through, as the backoff running out would"""
+    breaker.retry_at = 0.0
+
+
+def test_scan(client):
+    fill(client)
+
+    cursor, keys = client.scan(0, count=10)
+    while cursor:
+        cursor, more = client.scan(cursor, count=10)
+        keys.extend(more)
+
+    assert len(set(keys)) == 51
+
+
+def test_scan_iter(client):
+    fill(client)
+    db = SubRedis(client, "A")
+
+    assert len(set(db.scan_iter(match="key:*", count=10))) == 50
+
+
+def test_to_dict(client):
+    fill(client)
+
+    dumped = client.to_dict(match="A:*")
+
+    assert dumped["A"]["key"]["7"]["A:key:7"] == "7"
+    assert dumped["A"]["hash"]["A:hash"] == {"field": "value"}
+
+
+def test_async_scan_iter_and_dump(async_client):
+    async def main():
+        for i in range(50):
+            await async_client.set(f"A:key:{i}", str(i))
+
+        db = AsyncSubRedis(async_client, "A")
+        keys = [key async for key in db.scan_iter(match="key:*", count=10)]
+        dumped = [record async for record in async_client.iter_dump(match="A:*", count=10)]
+
+        return keys, dumped
+
+    keys, dumped = run(main())
+
+    assert len(set(keys)) == 50
+    assert len(dumped) == 50
+
+
+def test_replay_script_after_script_flush(client, breaker):
+    importorskip("lupa")
+    script = RedisScript("return redis.call('SET', KEYS[1], ARGV[1])")
+    script.run(client, 1, "A:script", "before")
+
+    trip(breaker)
+    assert script.run(client, 1, "A:script", "after") is None
+
+    # Redis restarted during the outage, with an empty script cache
+    with CircuitBreaker.bypass():
+        client.script_flush()
+
+    retry(breaker)
+
+    assert client.get("A:script") == "after"
+    assert not breaker.pending and not breaker.dead
+
+
+def test_replay_rejected_write(client, breaker):
+    client.set("A:string", "value")
+
+    trip(breaker)
+    client.hset("A:string", "field", "value")
+    client.set("A:after", "1")
+
+    retry(breaker)
+
+    # The rejected write doesn't fail the call that flushed it, or stop the writes after it
+    assert client.get("A:string") == "value"
+    assert client.get("A:after") == "1"
+    assert breaker.state == "closed"
+    assert not breaker.pending
+
+    (args, _, error), = breaker.dead
+    assert args[0] == "HSET" and isinstance(error, ResponseError)
+
+
+def test_replay_rejected_write_pipeline(client, breaker):
+    client.set("A:string", "value")
+
+    trip(breaker)
+    client.hset("A:string", "field", "value")
+    client.set("A:after", "1")
+
+    retry(breaker)
+
+    pipe = client.pipeline()
+    pipe.get("A:string")
+    pipe.get("A:after")
+    assert pipe.execute() == ["value", "1"]
+
+    assert not breaker.pending
+    assert len(breaker.dead) == 1
+
+    # The pipeline's own errors are still raised
+    pipe = client.pipeline()
+    pipe.hset("A:string", "field", "value")
+    with raises(ResponseError):
+        pipe.execute()
+
+
+def test_async_replay_rejected_write(async_client, breaker):
+    async def main():
+        await async_client.set("A:string", "value")
+
+        trip(breaker)
+        await async_client.hset("A:string", "field", "value")
+        await async_client.set("A:after", "1")
+
+        retry(breaker)
+
+        return await async_client.get("A:string"), await async_client.get("A:after")
+
+    assert run(main()) == ("value", "1")
+    assert not breaker.pending
+    assert len(breaker.dead) == 1
+
+
+def test_setters_not_queued(async_client, breaker):
+    prefixes = PrefixResolver(AsyncSubRedis(async_client, "config"))
+    permissions = PermissionIndex(AsyncSubRedis(async_client, "config"))
+
+    async def main():
+        assert await permissions.add_sudoer(1)
+        assert not await permissions.add_sudoer(1)
+
+        trip(breaker)
+
+        # Their replies are needed, so they fail rather than reply None from the queue
+        with raises(CircuitOpenError):
+            await prefixes.set_default("?")
+        with raises(CircuitOpenError):
+            await prefixes.set_mention()
+        with raises(CircuitOpenError):
+            await prefixes.set_guild(1, "?")
+        with raises(CircuitOpenError):
+            await permissions.add_sudoer(2)
+        with raises(CircuitOpenError):
+            await permissions.remove_sudoer(1)
+
+        # Other writes are still queued
+        assert await async_client.set("A:key", "value") is None
+
+    run(main())
+
+    assert prefixes.default_prefix == "!" and not prefixes.when_mentioned and not prefixes.guilds
+    assert permissions.sudoers == {1}
+    assert len(breaker.pending) == 1
+
+
+def test_replica_reads_remembered(client, breaker):
+    pool = ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=fakeredis.FakeServer(), decode_responses=True)
+    replica = Redis(connection_pool=pool)
+    replica.set("A:key", "replicated")
+    reader = ReplicaReader(client, [replica])
+
+    assert reader.get("A:key") == "replicated"
+
+    trip(breaker)
+
+    assert client.get("A:key") == "replicated"
+
+
+def test_snapshot_replies_not_cached(client, breaker):
+    db = SubRedis(client, "A", cache=RedisCache())
+    client.set("A:key", "before")
+    client.get("A:key")
+
+    trip(breaker)
+    assert db.get("key") == "before"
+    assert not len(db.cache)
+
+    # Changed during the outage, and read once Redis is back
+    with CircuitBreaker.bypass():
+        client.set("A:key", "after")
+
+    retry(breaker)
+    client.ping()
+
+    assert db.get("key") == "after"
+    assert len(db.cache) == 1
+
+
+def test_async_snapshot_replies_not_cached(async_client, breaker):
+    db = AsyncSubRedis(async_client, "A", cache=RedisCache())
+
+    async def main():
+        await async_client.set("A:key", "before")
+        await async_client.get("A:key")
+
+        trip(breaker)
+        return await db.get("key")
+
+    assert run(main()) == "before"
+    assert not len(db.cache)
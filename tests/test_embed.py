@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+
+# Local
+from utils.classes import Embed
+
+
+"""
+    Embed field pagination against Discord's limits.
+"""
+
+
+def test_paginate_fields_long_name():
+    em = Embed()
+    em.add_field(name="n" * Embed.FIELD_NAME_LIMIT, value="\n".join("v" * 100 for _ in range(30)), inline=False)
+
+    em.paginate_fields(limit=Embed.FIELD_VALUE_LIMIT)
+    fields = em.to_dict()["fields"]
+
+    assert len(fields) > 1
+    assert fields[0]["name"] == "n" * Embed.FIELD_NAME_LIMIT
+    assert all(len(field["name"]) <= Embed.FIELD_NAME_LIMIT for field in fields)
+    assert all(field["name"].endswith(" (Cont.)") for field in fields[1:])
+    assert all(len(field["value"]) <= Embed.FIELD_VALUE_LIMIT for field in fields)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+
+# Lib
+from time import sleep
+
+# Site
+from pytest import fixture
+
+# Local
+from utils.memory import MemoryRedis, MemoryStore
+
+
+"""
+    Persistence of MemoryStore to its append-only file.
+"""
+
+
+@fixture
+def path(tmp_path):
+    return str(tmp_path / "store.aof")
+
+
+def write(client: MemoryRedis) -> None:
+    client.set("A:string", "value")
+    client.incrby("A:counter", 2)
+    client.rpush("A:list", "a", "b")
+    client.hset("A:hash", mapping={"field": "value", "other": "1"})
+    client.hdel("A:hash", "other")
+    client.sadd("A:set", "x", "y")
+
+
+def test_flushed_on_interval(path):
+    store = MemoryStore(path, fsync_interval=0.05)
+    client = MemoryRedis(store)
+
+    # The last write of a burst is flushed without another write to trigger it
+    write(client)
+    sleep(0.5)
+
+    assert MemoryStore(path).data == store.data
+
+
+def test_not_flushed_before_interval(path):
+    store = MemoryStore(path, fsync_interval=60.0)
+    MemoryRedis(store).set("A:string", "value")
+
+    assert MemoryStore(path).data == dict()
+
+    store.flush()
+
+    assert MemoryStore(path).data == store.data
+
+
+def test_replay_after_torn_write(path):
+    store = MemoryStore(path, fsync_interval=60.0)
+    write(MemoryRedis(store))
+    store.flush()
+
+    # Crashed partway through writing a line
+    with open(path, "a", encoding="utf8") as fp:
+        fp.write('["SET","A:torn","va')
+
+    replayed = MemoryStore(path, fsync_interval=60.0)
+    assert replayed.data == store.data
+
+    # Written after the torn line, not onto it
+    MemoryRedis(replayed).set("A:after", "1")
+    replayed.flush()
+
+    assert MemoryStore(path).data == {**store.data, "A:after": "1"}
+
+
+def test_rewrite(path):
+    store = MemoryStore(path, fsync_interval=60.0, rewrite_min=20)
+    client = MemoryRedis(store)
+
+    for i in range(30):
+        client.incrby("A:counter", 1)
+        store.flush()
+
+    client.rpush("A:list", "a")
+    store.flush()
+
+    with open(path, encoding="utf8") as fp:
+        assert len(fp.readlines()) < 20
+
+    assert MemoryStore(path).data == {"A:counter": "30", "A:list": ["a"]}
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+
+# Lib
+from random import Random
+from re import escape, fullmatch, sub
+from typing import List
+
+# Site
+from pytest import mark
+
+# Local
+from utils.classes import Paginator
+
+
+"""
+    Properties of Paginator, checked against generated command output.
+"""
+
+
+SEEDS = range(300)
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+
+def text(rand: Random, lines: int) -> str:
+    """Mostly short lines, with some long lines, blank lines and words longer than a page"""
+
+    out = list()
+
+    for _ in range(lines):
+        roll = rand.random()
+
+        if roll < 0.05:
+            out.append("x" * rand.randint(100, 600))
+        elif roll < 0.15:
+            out.append(" ".join(rand.choices(WORDS, k=rand.randint(20, 80))))
+        elif roll < 0.2:
+            out.append("")
+        else:
+            out.append(" ".join(rand.choices(WORDS, k=rand.randint(1, 12))))
+
+    return "\n".join(out)
+
+
+def output(rand: Random) -> str:
+    """Text with some of its parts in code blocks"""
+
+    parts = list()
+
+    for _ in range(rand.randint(1, 6)):
+        body = text(rand, rand.randint(1, 30)).strip() or "x"
+
+        if rand.random() < 0.6:
+            body = f"```{rand.choice(['py', '', 'ansi', 'diff'])}\n{body}\n```"
+
+        parts.append(body)
+
+    return "\n".join(parts)
+
+
+def unfenced(string: str) -> str:
+    """``string`` without fences, their tags or whitespace"""
+    return sub(r"\s", "", sub(r"```[\w+#.-]*", "", string))
+
+
+def rejoined(string: str, pages: List[str]) -> bool:
+    """Whether ``pages`` are consecutive slices of ``string``, apart from one separator dropped at each break"""
+    return fullmatch("[\n ]?".join(map(escape, pages)), string) is not None
+
+
+@mark.parametrize("seed", SEEDS)
+def test_page_limit(seed):
+    rand = Random(seed)
+    limit = rand.randint(1, 400)
+
+    for code_blocks in (False, True):
+        for page in Paginator(limit, None, code_blocks).iter_pages(output(rand)):
+            assert len(page) <= limit
+
+
+@mark.parametrize("seed", SEEDS)
+def test_trunc_limit(seed):
+    rand = Random(seed)
+    limit = rand.randint(1, 400)
+    trunc_limit = rand.randint(0, 3000)
+
+    for code_blocks in (False, True):
+        pages = Paginator(limit, trunc_limit, code_blocks).paginate(output(rand))
+
+        assert sum(map(len, pages)) <= trunc_limit
+        assert all(len(page) <= limit for page in pages)
+
+
+@mark.parametrize("seed", SEEDS)
+def test_content_preserved(seed):
+    rand = Random(seed)
+    string = output(rand)
+
+    assert rejoined(string, Paginator(rand.randint(1, 400), None).paginate(string))
+
+
+@mark.parametrize("seed", SEEDS)
+def test_content_preserved_code_blocks(seed):
+    rand = Random(seed)
+    string = output(rand)
+
+    pages = Paginator(rand.randint(48, 400), None, code_blocks=True).paginate(string)
+
+    assert "".join(map(unfenced, pages)) == unfenced(string)
+
+
+@mark.parametrize("seed", SEEDS)
+def test_balanced_fences(seed):
+    rand = Random(seed)
+    trunc_limit = rand.choice([None, rand.randint(0, 3000)])
+
+    for page in Paginator(rand.randint(48, 400), trunc_limit, code_blocks=True).iter_pages(output(rand)):
+        assert page.count("```") % 2 == 0
+
+        # Every block has more than its fences and tag in it
+        assert not any(fullmatch(r"[\w+#.-]*\s*", block) for block in page.split("```")[1::2])
+
+
+def test_reopens_tag():
+    string = "text before\n```py\n" + "\n".join(f"x = {i}" for i in range(40)) + "\n```\nafter"
+    pages = Paginator(60, None, code_blocks=True).paginate(string)
+
+    assert len(pages) > 2
+    assert all(page.startswith("```py\n") for page in pages[1:-1])
+    assert pages[-1].endswith("```\nafter")
+
+
+def test_opening_fence_carried():
+    string = "a" * 20 + "\n```py\n" + "y" * 36 + "\n```"
+
+    assert Paginator(60, None, code_blocks=True).paginate(string) == ["a" * 20, "```py\n" + "y" * 36 + "\n```"]
+
+
+def test_truncated_to_fences():
+    assert Paginator(60, 30, code_blocks=True).paginate("a" * 20 + "\n```py\n" + "y" * 30 + "\n```") == ["a" * 20]
+    assert Paginator(60, 8, code_blocks=True).paginate("```py\n" + "y" * 30 + "\n```") == []
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+
+# Site
+from pytest import mark
+
+# Local
+from utils.classes import RedisStats
+
+
+"""
+    Keys RedisStats attributes commands to.
+"""
+
+
+@mark.parametrize("args", [
+    ("SCRIPT LOAD", "return redis.call('GET', KEYS[1])"),
+    ("SCRIPT EXISTS", "da39a3ee5e6b4b0d3255bfef95601890afd80709"),
+    ("CLIENT SETNAME", "bot"),
+    ("CONFIG GET", "maxmemory"),
+    ("OBJECT", "ENCODING", "A:key"),
+    ("PUBLISH", "channel", "message"),
+    ("SCAN", 0),
+    ("EVALSHA", "da39a3ee5e6b4b0d3255bfef95601890afd80709", 0),
+])
+def test_keyless(args):
+    assert RedisStats().key_of(args) is None
+
+
+@mark.parametrize("args, key", [
+    (("GET", "A:key"), "A:key"),
+    (("MEMORY USAGE", "A:key"), "A:key"),
+    (("EVALSHA", "da39a3ee5e6b4b0d3255bfef95601890afd80709", 1, "A:key", "arg"), "A:key"),
+])
+def test_key(args, key):
+    assert RedisStats().key_of(args) == key
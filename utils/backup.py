@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+
+"""Bulk backup and restore of a Redis keyspace
+
+Dumps are gzipped, line-delimited JSON. Each line is one key:
+
+    {"key": "SESTREN:config:run", "type": "hash", "ttl": null, "value": {...}}
+
+``ttl`` is the remaining time to live in milliseconds, or null for
+keys without an expiry.
+
+Can be used from the command line to snapshot, migrate or seed a
+local Redis for benchmarking:
+
+    python -m utils.backup dump SESTREN.jsonl.gz
+    python -m utils.backup restore SESTREN.jsonl.gz --port 6380
+"""
+
+
+# Lib
+import gzip
+from argparse import ArgumentParser
+from asyncio import run
+from json import dumps, load, loads
+from typing import Any, Dict, List
+
+# Site
+from redis.asyncio.sentinel import Sentinel
+
+# Local
+from utils.classes import AsyncRedis, AsyncRedisCluster
+from utils.memory import AsyncMemoryRedis, MemoryStore
+
+
+def _encode(value: Any) -> Any:
+    """Undo the bool transform so values are restored as they were stored"""
+
+    if isinstance(value, bool):
+        return str(value)
+
+    elif isinstance(value, list):
+        return [_encode(v) for v in value]
+
+    elif isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+
+    return value
+
+
+async def _write_chunk(db: AsyncRedis, records: List[Dict[str, Any]], replace: bool) -> None:
+    """Write ``records`` to ``db`` in one pipelined round trip"""
+
+    async with db.pipeline(transaction=False) as pipe:
+        for record in records:
+            key = record["key"]
+            data_type = record["type"]
+            value = _encode(record["value"])
+
+            if replace:
+                pipe.delete(key)
+
+            if data_type == "string":
+                pipe.set(key, value)
+            elif data_type == "list" and value:
+                pipe.rpush(key, *value)
+            elif data_type == "set" and value:
+                pipe.sadd(key, *value)
+            elif data_type == "zset" and value:
+                pipe.zadd(key, {member: score for member, score in value})
+            elif data_type == "hash" and value:
+                pipe.hset(key, mapping=value)
+
+            if record.get("ttl"):
+                pipe.pexpire(key, record["ttl"])
+
+        await pipe.execute()
+
+
+async def dump(db: AsyncRedis, path: str, match: str = "*", count: int = 1000) -> int:
+    """
+    Stream every key matching ``match`` into a dump file at ``path``
+
+    Records are written as they arrive from `AsyncRedis.iter_dump`, so
+    memory use is bounded by ``count``. TTLs are fetched with one more
+    pipelined round trip per batch.
+
+    Returns the number of keys written
+    """
+    written = 0
+    batch = list()
+
+    async def flush():
+        async with db.pipeline(transaction=False) as pipe:
+            for key, _, _ in batch:
+                pipe.pttl(key)
+            ttls = await pipe.execute()
+
+        for (key, data_type, value), ttl in zip(batch, ttls):
+            record = {
+                "key": key,
+                "type": data_type,
+                "ttl": ttl if ttl > 0 else None,
+                "value": list(value) if data_type == "set" else value
+            }
+            fp.write(dumps(record, separators=(",", ":")))
+            fp.write("\n")
+
+        batch.clear()
+
+    with gzip.open(path, "wt", encoding="utf8") as fp:
+        async for record in db.iter_dump(match=match, count=count):
+            batch.append(record)
+            written += 1
+
+            if len(batch) >= count:
+                await flush()
+
+        if batch:
+            await flush()
+
+    return written
+
+
+async def restore(db: AsyncRedis, path: str, chunk: int = 500, replace: bool = True) -> int:
+    """
+    Restore a dump file at ``path`` into ``db``
+
+    Keys are written ``chunk`` at a time, one pipelined round trip per
+    chunk, preserving their types and remaining TTLs.
+
+    ``replace`` deletes each key before writing it, so the restored
+    value is not merged with what is already there
+
+    Returns the number of keys restored
+    """
+    restored = 0
+    records = list()
+
+    with gzip.open(path, "rt", encoding="utf8") as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+
+            records.append(loads(line))
+
+            if len(records) >= chunk:
+                await _write_chunk(db, records, replace)
+                restored += len(records)
+                records.clear()
+
+    if records:
+        await _write_chunk(db, records, replace)
+        restored += len(records)
+
+    return restored
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Dump or restore a Redis keyspace")
+    parser.add_argument("action", choices=("dump", "restore"))
+    parser.add_argument("file", help="Path of the gzipped dump file")
+    parser.add_argument("--config", default="redis.json", help="Redis configuration JSON")
+    parser.add_argument("--host", help="Override the host from the configuration")
+    parser.add_argument("--port", type=int, help="Override the port from the configuration")
+    parser.add_argument("--db", type=int, help="Override the db number from the configuration")
+    parser.add_argument("--match", help="Pattern of keys to dump, all of SESTREN's keys by default")
+    parser.add_argument("--count", type=int, default=1000, help="Keys per pipelined batch")
+    parser.add_argument("--merge", action="store_true", help="Merge into existing keys instead of replacing")
+    options = parser.parse_args()
+
+    with open(options.config, "r") as redis_conf:
+        conf = load(redis_conf)
+
+    for option in ("host", "port", "db"):
+        if getattr(options, option) is not None:
+            conf[option] = getattr(options, option)
+
+    backend = conf.pop("backend", "redis")
+    memory_conf = {key: conf.pop(key) for key in ("path", "fsync_interval") if key in conf}
+    conf.pop("snapshot", None)
+    conf.pop("timeout", None)
+
+    if backend == "memory":
+        client = AsyncMemoryRedis(MemoryStore(**memory_conf))
+    elif backend == "cluster":
+        conf.pop("db", None)
+        client = AsyncRedisCluster(**conf)
+    elif "sentinel" in conf:
+        # Always the current primary, never a replica
+        sentinel = conf.pop("sentinel")
+        conf.pop("replicas", None)
+        conf.pop("host", None)
+        conf.pop("port", None)
+        client = Sentinel(sentinel["hosts"], **conf).master_for(sentinel["service"], redis_class=AsyncRedis)
+    else:
+        conf.pop("replicas", None)
+        client = AsyncRedis(**conf)
+
+    if options.action == "dump":
+        # Cluster keys carry the app namespace as a hash tag
+        match = options.match or ("{SESTREN}:*" if backend == "cluster" else "SESTREN:*")
+        total = run(dump(client, options.file, match, options.count))
+        print(f"Dumped {total} keys to {options.file}")
+
+    else:
+        total = run(restore(client, options.file, options.count, not options.merge))
+        print(f"Restored {total} keys from {options.file}")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+
+"""Timing of the text pagination used for command output
+
+Pages generated text of increasing size through each user of the
+pagination engine and reports the time per megabyte. Pagination is
+linear when that figure stays flat as the input grows:
+
+    python -m utils.benchmark
+    python -m utils.benchmark --sizes 1 4 16 --limit 1024
+"""
+
+
+# Lib
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List
+
+# Local
+from utils.classes import Embed, Paginator
+
+
+MB = 1024 * 1024
+
+
+def sample(size: int, seed: int = 0) -> str:
+    """Text of `size` characters shaped like command output. Mostly short
+    lines, with some long lines and some words longer than a page"""
+
+    rand = Random(seed)
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+    lines = list()
+    length = 0
+
+    while length < size:
+        roll = rand.random()
+
+        if roll < 0.01:
+            line = "x" * rand.randint(1000, 5000)
+        elif roll < 0.1:
+            line = " ".join(rand.choices(words, k=rand.randint(200, 600)))
+        else:
+            line = " ".join(rand.choices(words, k=rand.randint(0, 15)))
+
+        lines.append(line)
+        length += len(line) + 1
+
+    return "\n".join(lines)[:size]
+
+
+def measure(paginate: Callable[[str, int], Iterable[str]], string: str, limit: int, repeat: int = 3) -> float:
+    """Best of `repeat` runs, in seconds"""
+
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in paginate(string, limit):
+            pass
+        best = min(best, perf_counter() - start)
+
+    return best
+
+
+CASES: Dict[str, Callable[[str, int], Iterable[str]]] = {
+    "Paginator": lambda string, limit: Paginator(limit, trunc_limit=None).iter_pages(string),
+    "Paginator code blocks": lambda string, limit: Paginator(limit, trunc_limit=None, code_blocks=True).iter_pages(
+        f"```py\n{string}\n```"
+    ),
+    "Embed.paginate_string": Embed.paginate_string,
+}
+
+
+def run(sizes: List[float], limit: int, repeat: int) -> None:
+
+    print(f"{'case':<28}{'size (MB)':>12}{'seconds':>12}{'s/MB':>12}")
+
+    for name, paginate in CASES.items():
+        for size in sizes:
+            string = sample(int(size * MB))
+            seconds = measure(paginate, string, limit, repeat)
+            print(f"{name:<28}{size:>12g}{seconds:>12.4f}{seconds / size:>12.4f}")
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4, 8], help="Input sizes in megabytes")
+    parser.add_argument("--limit", type=int, default=1000, help="Page length limit")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size, the best is reported")
+    args = parser.parse_args()
+
+    run(args.sizes, args.limit, args.repeat)
@@ -2,17 +2,16 @@
 
 
 # Lib
-from typing import Callable
+from inspect import iscoroutinefunction
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, Tuple
 
 # Site
 from discord.channel import DMChannel, GroupChannel
 from discord.ext.commands.context import Context
 from discord.ext.commands.core import check
-from discord.utils import find
+from discord.utils import maybe_coroutine
 
 # Local
-from main import db
-from utils.classes import SubRedis
 
 
 """
@@ -20,17 +19,61 @@ from utils.classes import SubRedis
 """
 
 
-config = SubRedis(db, "config:permissions")
+class Chain:
+    """A flattened chain of predicates, evaluated as one check.
+
+    Nested chains of the same kind are merged, so `supercede` stacked on
+    `supercede` is a single any-of rather than closures calling closures.
+    Terms run cheapest first (sync before async) and stop at the first
+    deciding result. Each term's result is memoized on the Context for
+    the author and guild, so a predicate shared by several checks on one
+    invocation only runs once."""
+
+    def __init__(self, any_of: bool, predicates: Iterable[Callable]):
+        self.any_of = any_of
+
+        terms = list()
+        for predicate in predicates:
+            if isinstance(predicate, Chain) and predicate.any_of is any_of:
+                terms.extend(predicate.terms)
+            else:
+                terms.append(predicate)
+
+        # sorted() is stable, so equal costs keep their declared order
+        self.terms: Tuple[Callable, ...] = tuple(sorted(dict.fromkeys(terms), key=cost))
+        self.cost = sum(cost(term) for term in self.terms)
+
+    async def __call__(self, ctx: Context) -> bool:
+        for term in self.terms:
+            if await evaluate(term, ctx) is self.any_of:
+                return self.any_of
+        return not self.any_of
+
+
+def cost(predicate: Callable) -> int:
+    """Relative cost of evaluating a predicate. Anything awaited may do I/O"""
+    if isinstance(predicate, Chain):
+        return predicate.cost
+    return 1 if iscoroutinefunction(predicate) else 0
+
+
+async def evaluate(predicate: Callable, ctx: Context) -> bool:
+    """Run a predicate once per author and guild for this invocation"""
+
+    memo: Dict[Tuple[Callable, int, Optional[int]], bool] = ctx.__dict__.setdefault("_check_memo", dict())
+    key = (predicate, ctx.author.id, ctx.guild.id if ctx.guild else None)
+
+    if key not in memo:
+        memo[key] = bool(await maybe_coroutine(predicate, ctx))
+    return memo[key]
 
 
 def supercede(precedent: Callable) -> Callable:
     """Decorate a predicate.
     Pass a predicate as param.
     Returns True if either test True."""
-    def decorator(predicate: Callable) -> Callable:
-        def wrapper(ctx: Context) -> bool:
-            return precedent(ctx) or predicate(ctx)
-        return wrapper
+    def decorator(predicate: Callable) -> Chain:
+        return Chain(True, (precedent, predicate))
     return decorator
 
 
@@ -38,10 +81,8 @@ def require(requisite: Callable) -> Callable:
     """Decorate a predicate.
     Pass a predicate as param.
     Returns False if either test False."""
-    def decorator(predicate: Callable) -> Callable:
-        def wrapper(ctx: Context) -> bool:
-            return predicate(ctx) and requisite(ctx)
-        return wrapper
+    def decorator(predicate: Callable) -> Chain:
+        return Chain(False, (predicate, requisite))
     return decorator
 
 
@@ -68,26 +109,27 @@ def bot_owner(ctx: Context) -> bool:
     return chk()
 
 
-@require(no_pm)  # can't have roles in PMs
-@supercede(bot_owner)
-def has_role(ctx: Context, chk) -> bool:  # TODO: What type is chk?
+def role_member(ctx: Context, role_ids: FrozenSet[int]) -> bool:
     """
-    Check if someone has a role,
+    Check if someone has any of a set of roles
     :param ctx:
-    :param chk: Prepped find() argument
-    :return: Whether or not the role was found
+    :param role_ids: IDs of the roles to look for
+    :return: Whether or not one of the roles was found
     """
-    # Take a prepped find() argument and pass it in
-    return find(chk, ctx.author.roles) is not None
+    if ctx.guild is None:
+        return False
+    return any(ctx.author.get_role(role_id) is not None for role_id in role_ids)
 
 
 @supercede(bot_owner)
-def sudoer(ctx: Context) -> bool:
-    return ctx.author in db.smembers(f'{config}:sudoers')
+async def sudoer(ctx: Context) -> bool:
+    permissions = ctx.bot.permissions
+    await permissions.fresh()
+    return permissions.is_sudoer(ctx.author.id)
 
 
 @supercede(sudoer)
-def admin_perm(ctx: Context) -> bool:  # TODO: Why didn't this work?
+def admin_perm(ctx: Context) -> bool:
     if ctx.guild:
         return ctx.author.guild_permissions.administrator
     else:
@@ -100,18 +142,31 @@ def admin_perm(ctx: Context) -> bool:  # TODO: Why didn't this work?
 
 
 def owner():
-    def predicate(ctx: Context) -> bool:
-        return bot_owner(ctx)
+    async def predicate(ctx: Context) -> bool:
+        return await evaluate(bot_owner, ctx)
     return check(predicate)
 
 
 def sudo():
-    def predicate(ctx: Context) -> bool:
-        return sudoer(ctx)
+    async def predicate(ctx: Context) -> bool:
+        return await evaluate(sudoer, ctx)
     return check(predicate)
 
 
 def has_admin():
-    def predicate(ctx: Context) -> bool:
-        return admin_perm(ctx)
+    async def predicate(ctx: Context) -> bool:
+        return await evaluate(admin_perm, ctx)
+    return check(predicate)
+
+
+def has_role(*role_ids: int):
+    role_ids = frozenset(role_ids)
+
+    @require(no_pm)  # can't have roles in PMs
+    @supercede(bot_owner)
+    def chain(ctx: Context) -> bool:
+        return role_member(ctx, role_ids)
+
+    async def predicate(ctx: Context) -> bool:
+        return await evaluate(chain, ctx)
     return check(predicate)
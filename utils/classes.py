@@ -4,38 +4,291 @@
 from __future__ import annotations
 
 # Lib
-from asyncio import CancelledError
-from asyncio.tasks import sleep
+import atexit
+from asyncio import (
+    CancelledError, Future, Lock as AsyncLock, Queue, QueueFull, TimeoutError as AsyncTimeoutError, ensure_future,
+    get_running_loop, shield, wait_for
+)
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from copy import copy
+from fnmatch import fnmatchcase
+from functools import partial
+from hashlib import sha1
+from json import dump, load, loads
+from os import replace
+from os.path import exists
 from re import match
+from tempfile import SpooledTemporaryFile
+from threading import Lock
+from time import monotonic, perf_counter, time
 from traceback import extract_tb
-from typing import Any, Dict, Generator, List, Set, Tuple, Union
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Deque, Dict, Generator, Iterable, List, Optional, Set, Tuple, Union
 
 # Site
+from aiohttp.client import ClientSession
+from discord.abc import Messageable
 from discord.appinfo import AppInfo
 from discord.channel import TextChannel
 from discord.colour import Colour
 from discord.embeds import Embed as DiscordEmbed
 from discord.errors import DiscordException, LoginFailure
-from discord.ext.commands.bot import Bot as DiscordBot
+from discord.file import File
+from discord.ext.commands.bot import Bot as DiscordBot, when_mentioned
 from discord.ext.commands.context import Context
 from discord.ext.commands.converter import IDConverter
 from discord.ext.commands.errors import BadArgument
 from discord.message import Message
-from discord.utils import get, find
-from redis.client import Redis as DefaultRedis
+from discord.utils import MISSING, get, find
+from discord.webhook.async_ import Webhook, WebhookMessage
+from redis.asyncio.client import Pipeline as DefaultAsyncPipeline, Redis as DefaultAsyncRedis
+from redis.asyncio.cluster import (
+    ClusterPipeline as DefaultAsyncClusterPipeline,
+    PipelineCommand as AsyncPipelineCommand,
+    RedisCluster as DefaultAsyncRedisCluster
+)
+from redis.client import Pipeline as DefaultPipeline, Redis as DefaultRedis
+from redis.cluster import ClusterPipeline as DefaultClusterPipeline, PipelineCommand, RedisCluster as DefaultRedisCluster
+from redis.commands.core import AsyncDataAccessCommands, DataAccessCommands
+from redis.exceptions import ConnectionError as RedisConnectionError, NoScriptError, RedisError, TimeoutError as RedisTimeoutError
 
 # Local
-from utils.utils import ZWSP, bool_transform, _get_from_guilds
+from utils.errors import CircuitOpenError
+from utils.utils import ZWSP, bool_str, bool_transform, _get_from_guilds
 
 
-class Embed(DiscordEmbed):
+class Paginator:
+    """Breaks text into pages for messages and embed fields
+
+    Pages are never longer than `page_limit`, and all pages together never
+    longer than `trunc_limit`, if set. With `code_blocks`, code blocks split
+    across pages are closed and reopened with the same language tag. The
+    fences count towards the limit, which must be at least 48 for this.
+
+    Embed paginates its fields with this too"""
 
+    # Longest language tag carried over when a code block is split
+    TAG_LIMIT = 16
+
+    # "```" + tag + "\n" to reopen a code block, "\n```" to close it
+    FENCE_RESERVE = TAG_LIMIT + 8
+
+    # Prioritize line breaks, then spaces, then no delimiter
     STR_PAGE_DEPTH = {
         0: "\n",
         1: " ",
         2: ""
     }
 
+    def __init__(
+            self,
+            page_limit: int = 1000,
+            trunc_limit: Optional[int] = 2000,
+            code_blocks: bool = False
+    ):
+        self.page_limit = page_limit
+        self.trunc_limit = trunc_limit
+        self.code_blocks = code_blocks
+        self._pages = None
+
+    @property
+    def pages(self):
+        return self._pages
+
+    def set_trunc_limit(self, limit: Optional[int] = 2000):
+        self.trunc_limit = limit
+
+    def set_page_limit(self, limit: int = 1000):
+        self.page_limit = limit
+
+    @staticmethod
+    def deconstruct(string: str, limit: int, depth: int = 0) -> Generator[Tuple[str, str], None, None]:
+        """Lazily breaks a string into sections of at most `limit` characters.
+        Yields tuples of the separator that preceded each section in the
+        original string, and the section itself.
+
+        Runs in a single pass. Each level of `STR_PAGE_DEPTH` only sees the
+        sections too long for the level above it"""
+
+        delimiter = Paginator.STR_PAGE_DEPTH[depth]
+
+        # Without a delimiter, words longer than `limit` are cut every `limit` characters
+        if not delimiter:
+            for start in range(0, len(string), limit):
+                yield "", string[start:start + limit]
+            return
+
+        separator = ""
+        start = 0
+
+        while True:
+            end = string.find(delimiter, start)
+            section = string[start:] if end == -1 else string[start:end]
+
+            if len(section) <= limit:
+                yield separator, section
+
+            else:
+                # The first piece of a long section keeps the separator before the section
+                for i, (sub_separator, piece) in enumerate(Paginator.deconstruct(section, limit, depth + 1)):
+                    yield sub_separator if i else separator, piece
+
+            if end == -1:
+                return
+
+            separator = delimiter
+            start = end + len(delimiter)
+
+    @staticmethod
+    def fence(tag: Optional[str], section: str) -> Optional[str]:
+        """The language tag of the code block open after `section`, given
+        the one open before it. None when outside of a code block"""
+
+        fences = section.count("```")
+
+        # Balanced fences, like inline ```code```, leave the state as it was
+        if not fences % 2:
+            return tag
+
+        if tag is not None:
+            return None
+
+        opened = section[section.rfind("```") + 3:]
+        return opened if match(rf"[\w+#.-]{{1,{Paginator.TAG_LIMIT}}}$", opened) else ""
+
+    @staticmethod
+    def pack(string: str, limit: int, code_blocks: bool = False) -> Generator[str, None, None]:
+        """Lazily reconstitute the sections of `deconstruct` into pages
+        no longer than `limit`
+
+        Sections are packed greedily into a list buffer, joined by their
+        original separators. The separator at a page break is dropped.
+
+        With `code_blocks`, fences are tracked as sections stream past. A
+        page that ends inside a code block is closed, and the next page
+        reopens it with the same language tag. A page is never closed right
+        after the fence that opened its block, the fence moves to the next page"""
+
+        # Room for reopening and closing a fence on a page that is all one section. Pages
+        # too short to also keep a fence line whole are split without tracking code blocks
+        fenced = code_blocks and limit >= 2 * Paginator.FENCE_RESERVE and "```" in string
+        reserve = Paginator.FENCE_RESERVE if fenced else 0
+
+        parts = list()
+        length = 0
+        pages = 0
+        tag = None
+
+        # Index in `parts` of the section that opened the current block, while only blank lines follow it
+        opened = None
+
+        for separator, section in Paginator.deconstruct(string, limit - reserve):
+
+            after = Paginator.fence(tag, section) if fenced and "```" in section else tag
+            closing = 4 if after is not None else 0  # "\n```"
+
+            if parts and length + len(separator) + len(section) + closing <= limit:
+                parts.append(separator)
+                parts.append(section)
+                length += len(separator) + len(section)
+
+            else:
+                # The block would close empty. Its fence is left to be reopened on the next page
+                if opened is not None:
+                    kept = parts[opened][:parts[opened].rfind("```")]
+                    del parts[opened:]
+
+                    if kept.strip():
+                        parts.append(kept)
+                    elif parts:
+                        parts.pop()
+
+                if parts:
+                    yield "".join(parts) + ("\n```" if tag is not None and opened is None else "")
+                    pages += 1
+                    parts = list()
+                    length = 0
+
+                opened = None
+
+                # A page that would open on the closing fence just leaves the block closed
+                if tag is not None and after is None and section.strip() == "```":
+                    tag = after
+                    continue
+
+                if tag is not None:
+                    parts.append(f"```{tag}\n")
+                    length = len(tag) + 4
+
+                parts.append(section)
+                length += len(section)
+
+            if tag is None and after is not None and section.endswith(f"```{after}"):
+                opened = len(parts) - 1
+            elif section.strip():
+                opened = None
+
+            tag = after
+
+        if parts or not pages:
+            yield "".join(parts) + ("\n```" if tag is not None else "")
+
+    def iter_pages(self, value: Any) -> Generator[str, None, None]:
+        """Lazily paginate a value"""
+
+        total = 0
+
+        for page in self.pack(str(value), self.page_limit, self.code_blocks):
+
+            if self.trunc_limit is not None and total + len(page) > self.trunc_limit:
+                page = page[:self.trunc_limit - total]
+
+                # Close a code block the cut left open
+                if self.code_blocks and page.count("```") % 2:
+                    opener = page.rfind("```")
+                    end = page.find("\n", opener)
+
+                    if end != -1 and page[end:-4].strip():
+                        page = f"{page[:-4]}\n```"
+                    else:
+                        # Nothing of the block survives the cut, so its fence goes too
+                        page = page[:opener].rstrip()
+
+                if page:
+                    yield page
+                return
+
+            total += len(page)
+            yield page
+
+    def paginate(self, value: Any) -> List[str]:
+        """
+        To paginate a string into a list of strings no longer
+        than `self.page_limit` characters. Total len of strings
+        will not exceed `self.trunc_limit`.
+        :param value: string to paginate
+        :return list: list of strings under 'page_limit' chars
+        """
+        self._pages = list(self.iter_pages(value))
+        return self.pages
+
+
+class Embed(DiscordEmbed):
+
+    # Discord's limits for a single embed. TOTAL_LIMIT also applies across all embeds of a message
+    TOTAL_LIMIT = 6000
+    FIELD_COUNT_LIMIT = 25
+    FIELD_NAME_LIMIT = 256
+    FIELD_VALUE_LIMIT = 1024
+    MESSAGE_EMBED_LIMIT = 10
+
+    # Fields longer than this in total are sent as a file by `overflow`
+    OVERFLOW_THRESHOLD = 12000
+
+    # Bytes of an overflow file kept in memory before it is moved to disk
+    SPOOL_SIZE = 1024 * 1024
+
     def copy(self):
         """Returns a shallow copy of the embed.
 
@@ -111,93 +364,36 @@ class Embed(DiscordEmbed):
          Length Sums
         ############# """
 
+    # Only these count towards Discord's 6000 character limit. URLs do not
     @property
     def head_len(self) -> int:
         return sum((
             self.title_len,
             self.description_len,
-            self.auth_name_len,
-            self.auth_url_len,
-            self.auth_icon_len,
-            self.thumb_len
+            self.auth_name_len
         ))
 
     @property
     def foot_len(self) -> int:
-        return sum((
-            self.image_len,
-            self.foot_text_len,
-            self.foot_icon_len
-        ))
+        return self.foot_text_len
+
+    @property
+    def total_len(self) -> int:
+        return self.head_len + sum(self.fields_len) + self.foot_len
 
     """ ############
          Pagination
         ############ """
 
-    @staticmethod
-    def deconstruct_string(string: str, limit: int = 1000, depth: int = 0) -> List[Tuple[str, str]]:
-        """Transforms a string into a list of tuples. The second element
-        of each tuple will be a section of the string. The first element
-        will be the breaking character that separates it from the next
-        section."""
-
-        # Prioritize line breaks, then spaces, then no delimiter
-        # Without a delimiter, it will stop at `limit` characters for
-        # words longer than `limit`
-        delimiter = Embed.STR_PAGE_DEPTH[depth]
-
-        if Embed.STR_PAGE_DEPTH[depth]:
-            strings = [(delimiter, piece) for piece in string.split(delimiter)]
-        else:
-            strings = [(delimiter, piece) for piece in list(string)]
-
-        ret = list()
-
-        # Build a list of each component section of the original string paired
-        # the the character that separated it from the next section
-        for delim, string in strings:
-            if len(delim) + len(string) <= limit:
-                ret.append((delim, string))
-            else:
-                ret.extend(Embed.deconstruct_string(string, limit, depth + 1))
-
-        return ret
-
     @staticmethod
     def paginate_string(string: str, limit: int = 1000) -> List[str]:
-        """Deconstruct a string into section/delimiter pairs and reconstitute
-        into a list of strings shorter than `limit`"""
-
-        deconstructed_string = Embed.deconstruct_string(string, limit)
-
-        ret = list()
-
-        # Prepare the first element
-        next_delim, page = deconstructed_string.pop(0)
-
-        for delim, string in deconstructed_string:
-
-            # Translate delimiters back into priorities for comparison
-            # Higher order delimiters take precedence to prevent merging words
-            delim_depth = {k: v for v, k in Embed.STR_PAGE_DEPTH.items()}
-            if delim_depth.get(delim) > delim_depth.get(next_delim):
-                next_delim = delim
-
-            if len(page) + len(next_delim) + len(string) <= limit:
-                page = next_delim.join((page, string))
-                next_delim = delim
-
-            else:
-                ret.append(page)
-                page = string
-                next_delim = delim
-
-        ret.append(page)
-        return ret
+        """Break a string into a list of strings no longer than `limit`"""
+        return Paginator(limit, trunc_limit=None).paginate(string)
 
     def paginate_fields(self, limit: int = 1000) -> None:
 
-        fields: List[dict] = [field.copy() for field in self.to_dict().get("fields")]
+        # clear_fields() empties the list to_dict() returns, so take a copy
+        fields: List[dict] = list(self.to_dict().get("fields", list()))
         self.clear_fields()
 
         for field in fields:
@@ -210,294 +406,2343 @@ class Embed(DiscordEmbed):
                 )
                 continue
 
-            value: str = field["value"]
-
-            if value.startswith("```") and value.endswith("```"):
-                cb_wrapped: bool = True
-                md: str = value.split("\n")[0].strip("```")
-                value: str = value.strip("```")
-                if md:
-                    value: str = value.replace(f"{md}\n", "")
-            else:
-                cb_wrapped: bool = False
-                md: str = ""
-
-            values = self.paginate_string(value, limit)
+            values = Paginator(limit, trunc_limit=None, code_blocks=True).iter_pages(field["value"])
 
-            if cb_wrapped:
-                values = [f"```{md}\n{value}\n```" for value in values]
+            # Shortened to leave room for the suffix, names may already be at the limit
+            cont = f"{field['name'][:self.FIELD_NAME_LIMIT - len(' (Cont.)')]} (Cont.)"
 
             for i, value in enumerate(values):
                 self.add_field(
-                    name=f"{field['name']}{' (Cont.)' if i else ''}",
+                    name=cont if i else field["name"],
                     value=value,
                     inline=field["inline"]
                 )
 
+    def overflow(self, threshold: int = None, filename: str = "output.txt") -> Tuple[List[Embed], Optional[File]]:
+        """Split into embeds, unless the fields total more than `threshold`
+        characters. Then the fields are written to a text file, and a summary
+        embed is returned to send with it instead
+
+        The file is written through a spooled buffer, so no more than
+        `SPOOL_SIZE` bytes of it are held in memory"""
+
+        threshold = self.OVERFLOW_THRESHOLD if threshold is None else threshold
+
+        fields: List[dict] = self.to_dict().get("fields", list())
+        fields_len = sum(len(field["name"]) + len(field["value"]) for field in fields)
+
+        if fields_len <= threshold:
+            return self.split(), None
+
+        buffer = SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+
+        for field in fields:
+            value: str = field["value"]
+
+            # Fences only mean something in Discord's markdown
+            if value.startswith("```") and value.endswith("```") and "\n" in value:
+                value = value[value.find("\n") + 1:-3]
+
+            buffer.write(f"{field['name']}\n{value.rstrip()}\n\n".encode())
+
+        buffer.seek(0)
+
+        # The first page of the first field as a preview
+        preview = Paginator(self.FIELD_VALUE_LIMIT // 2, trunc_limit=None, code_blocks=True)
+
+        summary = self._page(head=True, foot=True)
+        summary.add_field(
+            name=fields[0]["name"],
+            value=next(preview.iter_pages(fields[0]["value"])),
+            inline=False
+        )
+        summary.add_field(
+            name="Attached",
+            value=f"{len(fields)} field{'s' if len(fields) != 1 else ''}, {fields_len} characters in `{filename}`",
+            inline=False
+        )
+
+        return summary.split(), File(buffer, filename)
+
+    @staticmethod
+    def pack(embeds: Iterable[DiscordEmbed]) -> Generator[List[DiscordEmbed], None, None]:
+        """Group embeds into as few messages as Discord allows. A message
+        takes up to 10 embeds, with 6000 characters between all of them"""
+
+        group = list()
+        length = 0
+
+        for embed in embeds:
+            embed_len = embed.total_len if isinstance(embed, Embed) else len(embed)
+
+            if group and (len(group) >= Embed.MESSAGE_EMBED_LIMIT or length + embed_len > Embed.TOTAL_LIMIT):
+                yield group
+                group = list()
+                length = 0
+
+            group.append(embed)
+            length += embed_len
+
+        if group:
+            yield group
+
+    def _page(self, head: bool = False, foot: bool = False) -> Embed:
+        """A new embed without fields, in this embed's colour,
+        with the header and footer elements if asked for"""
+
+        page = Embed(colour=self.colour, timestamp=self.timestamp)
+
+        if head:
+            page.title = self.title
+            page.url = self.url
+            page.description = self.description
+            if self.author.name:
+                page.set_author(name=self.author.name, url=self.author.url, icon_url=self.author.icon_url)
+            if self.thumbnail.url:
+                page.set_thumbnail(url=self.thumbnail.url)
+
+        if foot:
+            self._add_foot(page)
+
+        return page
+
+    def _add_foot(self, page: Embed) -> None:
+        """Copy the footer elements of this embed to a page"""
+        if self.image.url:
+            page.set_image(url=self.image.url)
+        if self.footer.text or self.footer.icon_url:
+            page.set_footer(text=self.footer.text, icon_url=self.footer.icon_url)
+
     def split(self) -> List[Embed]:
+        """Split into as many embeds as needed to fit Discord's limits
 
-        self.paginate_fields(limit=1010)
+        The header goes on the first page and the footer on the last.
+        Page lengths are kept as running totals while fields are placed"""
 
-        if self.head_len + self.foot_len + sum(self.fields_len) < 6000:
-            return [self]
+        self.paginate_fields(limit=self.FIELD_VALUE_LIMIT)
 
-        pages = list()
-        page: Embed = self.copy()
+        fields: List[dict] = self.to_dict().get("fields", list())
+        head_len = self.head_len
+        foot_len = self.foot_len
 
-        fields = [field.copy() for field in self.to_dict().get("fields", None)]
+        if all((
+            head_len + sum(len(field["name"]) + len(field["value"]) for field in fields) + foot_len <= self.TOTAL_LIMIT,
+            len(fields) <= self.FIELD_COUNT_LIMIT
+        )):
+            return [self]
 
-        page.clear_fields()
-        page.strip_foot()
+        pages = list()
+        page: Embed = self._page(head=True)
+        page_len = head_len
+        page_fields = 0
 
         for field in fields:
 
             field_len = len(field["name"]) + len(field["value"])
 
-            if all((
-                page.head_len + len(page.fields_len) + field_len < 6000,
-                len(page.fields) <= 25
+            # An empty page always takes the field, the longest header and field fit together
+            if page_fields and any((
+                page_len + field_len > self.TOTAL_LIMIT,
+                page_fields >= self.FIELD_COUNT_LIMIT
             )):
-                page.add_field(
-                    name=field["name"],
-                    value=field["value"],
-                    inline=field["inline"]
-                )
+                pages.append(page)
+
+                page = self._page()
+                page_len = 0
+                page_fields = 0
+
+            page.add_field(
+                name=field["name"],
+                value=field["value"],
+                inline=field.get("inline", True)
+            )
+            page_len += field_len
+            page_fields += 1
+
+        if page_len + foot_len > self.TOTAL_LIMIT:
+            pages.append(page)
+            page = self._page()
+
+        self._add_foot(page)
+        pages.append(page)
+
+        return pages
+
+
+class MessageScheduler:
+    """Sends the bot's multi-message output
+
+    Each destination has its own queue and worker, so output for one
+    channel goes out in order without holding up any other. Embeds are
+    packed up to 10 per message. There is no fixed delay between sends,
+    discord.py tracks the rate limit buckets from response headers and
+    only waits when one is spent. Idle workers exit after `idle` seconds"""
+
+    def __init__(self, idle: float = 60.0):
+        self.idle = idle
+
+        # Destination ID -> queue of (destination, content, embeds, kwargs, future)
+        self.queues: Dict[int, Queue] = dict()
+        self.workers: Dict[int, Future] = dict()
+
+    async def send(self, destination: Messageable, content: str = None, embeds: Iterable[DiscordEmbed] = (),
+                   **kwargs) -> List[Message]:
+        """Send `content` and `embeds` to `destination` in as few messages as possible,
+        after anything queued for it before. Content and files go with the first message"""
+
+        # Context sends to its channel. Users and members to their DM channel
+        key = getattr(destination, "channel", destination).id
+
+        future = get_running_loop().create_future()
+
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = Queue()
+        queue.put_nowait((destination, content, list(embeds), kwargs, future))
+
+        if key not in self.workers or self.workers[key].done():
+            self.workers[key] = ensure_future(self._run(key, queue))
+
+        return await future
+
+    async def _run(self, key: int, queue: Queue) -> None:
+
+        while True:
+            try:
+                destination, content, embeds, kwargs, future = await wait_for(queue.get(), self.idle)
+            except AsyncTimeoutError:
+                if queue.empty():
+                    del self.queues[key]
+                    del self.workers[key]
+                    return
+                continue
+
+            # The caller stopped waiting
+            if future.done():
+                continue
+
+            try:
+                messages = list()
+
+                for group in Embed.pack(embeds) if embeds else [list()]:
+                    if group:
+                        kwargs["embeds"] = group
+                    messages.append(await destination.send(content, **kwargs))
+
+                    # Content and files go with the first message only
+                    content = None
+                    kwargs.pop("file", None)
+                    kwargs.pop("files", None)
+
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
 
             else:
-                pages.append(page)
+                if not future.done():
+                    future.set_result(messages)
+
+
+class WebhookTransport:
+    """Sends embeds through a webhook instead of the bot's own sends
+
+    Webhooks have their own rate limits, so a burst through one doesn't
+    hold up command replies. Every transport of a bot uses the bot's one
+    HTTP session, and embeds are packed up to 10 per call"""
+
+    def __init__(self, bot, url: str, username: str = None):
+        self.bot = bot
+        self.url = url
+        self.username = username
+        self._webhook: Optional[Webhook] = None
+
+    @property
+    def webhook(self) -> Webhook:
+        session = self.bot.get_session()
+
+        # Rebuilt if the session was replaced after being closed
+        if self._webhook is None or self._webhook.session is not session:
+            self._webhook = Webhook.from_url(self.url, session=session)
+
+        return self._webhook
+
+    async def send(self, content: str = None, embeds: Iterable[DiscordEmbed] = ()) -> List[WebhookMessage]:
+        """Send `content` and `embeds` in as few calls as possible. Content goes with the first"""
+
+        messages = list()
+        username = self.username or (self.bot.user.name if self.bot.user else MISSING)
+
+        for group in Embed.pack(embeds) if embeds else [list()]:
+            messages.append(await self.webhook.send(
+                content=content or MISSING,
+                embeds=group or MISSING,
+                username=username,
+                wait=True
+            ))
+            content = None
+
+        return messages
+
+
+class ErrorLog:
+    """Reports errors to a channel from a background task
+
+    `send` only fingerprints the error and queues it, so the coroutine
+    that failed never waits on the API. Repeats of a fingerprint within
+    `window` seconds are folded into the first report, which is edited
+    with a count once the window closes. While `maxsize` reports are
+    waiting, further errors are dropped and summarized once it drains.
+
+    With `db`, every error is also counted by fingerprint in Redis. Counts
+    are kept in memory and written in one batch every `flush_interval`.
+
+    With `webhook`, reports are sent through it instead of the channel.
+    Queued reports are packed into as few messages as possible"""
+
+    def __init__(self, bot, channel: Union[int, str, TextChannel] = None, window: float = 60.0, maxsize: int = 100,
+                 db: AsyncSubRedis = None, flush_interval: float = 10.0, webhook: WebhookTransport = None):
+        self.bot = bot
+        if isinstance(channel, int):
+            channel = self.bot.get_channel(channel)
+        elif isinstance(channel, str):
+            channel = self.bot.get_channel(int(channel))
+        if isinstance(channel, TextChannel):
+            self.channel = channel
+        else:
+            self.channel = None
+
+        self.webhook = webhook
+
+        self.window = window
+        self.queue: Queue = Queue(maxsize)
+
+        # fingerprint -> {"first": monotonic, "count": int, "pending": bool,
+        #                 "message": Message, "embeds": List[Embed], "index": int}
+        self.recent: Dict[str, Dict[str, Any]] = dict()
+
+        # (fingerprint, entry) moved out of `recent` once its window closed, until its count is folded in
+        self.expired: List[Tuple[str, Dict[str, Any]]] = list()
+
+        self.dropped: int = 0
+        self._worker: Optional[Future] = None
+
+        self.db = db
+        self.flush_interval = flush_interval
+
+        # fingerprint -> stats not yet written to `db`
+        self.stats: Dict[str, Dict[str, Any]] = dict()
+        self._flushed: float = monotonic()
+
+    @staticmethod
+    def fingerprint(error: BaseException) -> str:
+        """Identifies an error by its type and where it was raised from, not its message"""
+
+        frames = [(frame.filename, frame.name, frame.lineno) for frame in extract_tb(error.__traceback__)]
+        return sha1(repr((type(error).__qualname__, frames)).encode()).hexdigest()[:12]
+
+    async def send(self, error: Union[Exception, DiscordException], ctx: Context = None, event: str = None) -> None:
+        if not self.channel and not self.webhook:
+            raise AttributeError("ErrorLog channel not set")
+
+        if self._worker is None or self._worker.done():
+            self._worker = ensure_future(self._run())
+
+        fingerprint = self.fingerprint(error)
+        self.record(error, ctx, event, fingerprint)
+
+        seen = self.recent.get(fingerprint)
+
+        if seen and monotonic() - seen["first"] < self.window:
+            seen["count"] += 1
+            return
+
+        # The last window's count is still to be folded into its report
+        if seen:
+            self.expired.append((fingerprint, seen))
+
+        seen = self.recent[fingerprint] = {
+            "first": monotonic(), "count": 1, "pending": True, "message": None, "embeds": None, "index": None
+        }
+
+        try:
+            self.queue.put_nowait((error, ctx, event, fingerprint, seen))
+        except QueueFull:
+            seen["pending"] = False
+            self.dropped += 1
+
+    def record(self, error: BaseException, ctx: Optional[Context], event: Optional[str], fingerprint: str) -> None:
+        """Count an error towards the stats of its fingerprint"""
+
+        if self.db is None:
+            return
+
+        now = int(time())
+        stack = extract_tb(error.__traceback__)
+
+        stat = self.stats.setdefault(fingerprint, {
+            "count": 0,
+            "first_seen": now,
+            "type": type(error).__qualname__,
+            "location": f"{stack[-1].filename}:{stack[-1].lineno} in {stack[-1].name}" if stack else "",
+        })
+        stat["count"] += 1
+        stat["last_seen"] = now
+        stat["context"] = f"command {ctx.command.qualified_name}" if ctx and ctx.command else f"event {event}"
+
+    async def flush(self) -> None:
+        """Write the recorded stats to `db` in one batch"""
+
+        self._flushed = monotonic()
+
+        if not self.stats:
+            return
+
+        stats, self.stats = self.stats, dict()
+
+        try:
+            async with self.db.batch() as batch:
+                for fingerprint, stat in stats.items():
+                    details = {k: v for k, v in stat.items() if k not in ("count", "first_seen")}
+
+                    batch.zincrby("counts", stat["count"], fingerprint)
+                    batch.hsetnx(f"fingerprint:{fingerprint}", "first_seen", stat["first_seen"])
+                    batch.hset(f"fingerprint:{fingerprint}", mapping=details)
+        except Exception:
+            self._restore(stats)
+            raise
+
+    def _restore(self, stats: Dict[str, Dict[str, Any]]) -> None:
+        """Merge stats from a failed flush back into those recorded since"""
+
+        for fingerprint, stat in stats.items():
+            newer = self.stats.get(fingerprint)
+
+            if newer is None:
+                self.stats[fingerprint] = stat
+                continue
+
+            newer["count"] += stat["count"]
+            newer["first_seen"] = stat["first_seen"]
+
+    async def top(self, n: int = 10) -> List[Tuple[str, int, Dict[str, Any]]]:
+        """The `n` most raised fingerprints, with their counts and stats"""
+
+        await self.flush()
+
+        counts = await self.db.zrevrange("counts", 0, n - 1, withscores=True)
+
+        async with self.db.batch() as batch:
+            for fingerprint, _ in counts:
+                batch.hgetall(f"fingerprint:{fingerprint}")
+
+        return [(fingerprint, int(count), stat) for (fingerprint, count), stat in zip(counts, batch.results)]
+
+    async def _run(self) -> None:
+        """Send queued reports, fold repeats and summarize drops, until cancelled"""
+
+        while True:
+            try:
+                reports = [await wait_for(self.queue.get(), min(self.window, self.flush_interval))]
+            except AsyncTimeoutError:
+                reports = list()
+
+            # Whatever else is waiting goes out with it, up to a message's worth
+            while reports and len(reports) < Embed.MESSAGE_EMBED_LIMIT and not self.queue.empty():
+                reports.append(self.queue.get_nowait())
+
+            if reports:
+                try:
+                    await self._report(reports)
+                except Exception as e:
+                    print(f"| Failed to send error reports\n|   {type(e).__name__}: {e}")
+                finally:
+                    for *_, seen in reports:
+                        self.queue.task_done()
+                        seen["pending"] = False
+
+            try:
+                await self._fold()
+
+                if self.dropped and self.queue.empty():
+                    await self._summarize()
+
+                if self.db is not None and monotonic() - self._flushed >= self.flush_interval:
+                    await self.flush()
+            except Exception as e:
+                print(f"| Failed to update error log\n|   {type(e).__name__}: {e}")
+
+    async def _deliver(self, embeds: List[Embed]) -> Message:
+        """Send one message's worth of embeds"""
+
+        if self.webhook:
+            return (await self.webhook.send(embeds=embeds))[0]
+
+        return (await self.bot.outbox.send(self.channel, embeds=embeds))[0]
+
+    async def _report(self, reports: List[Tuple[BaseException, Optional[Context], Optional[str], str, Dict]]) -> None:
+        """Send every page of the reports for some errors, packed into as few messages as possible"""
+
+        # (entry, page), the `recent` entry only on the last page of each report
+        pages: List[Tuple[Optional[Dict[str, Any]], Embed]] = list()
+
+        for error, ctx, event, fingerprint, seen in reports:
+            em = await self.em_tb(error, ctx, event)
+            em.set_footer(text=f"Fingerprint {fingerprint}")
+
+            split = em.split()
+            pages.extend((seen if i == len(split) - 1 else None, page) for i, page in enumerate(split))
+
+        sent = 0
+
+        for embeds in Embed.pack(page for _, page in pages):
+            message = await self._deliver(embeds)
+
+            # The footer is on the last page. That is the one edited with the count
+            for index, (seen, _) in enumerate(pages[sent:sent + len(embeds)]):
+                if seen:
+                    seen.update(message=message, embeds=embeds, index=index)
+
+            sent += len(embeds)
+
+    async def _fold(self) -> None:
+        """Edit the count of repeats into reports whose window has closed"""
+
+        now = monotonic()
+
+        for fingerprint, seen in list(self.recent.items()):
+            if now - seen["first"] >= self.window:
+                del self.recent[fingerprint]
+                self.expired.append((fingerprint, seen))
+
+        expired, self.expired = self.expired, list()
+
+        for fingerprint, seen in expired:
+
+            # Still waiting to be sent. Its count is edited in once it has been
+            if seen["pending"]:
+                self.expired.append((fingerprint, seen))
+                continue
+
+            if seen["message"] and seen["count"] > 1:
+                page: Embed = seen["embeds"][seen["index"]]
+                page.set_footer(text=f"Fingerprint {fingerprint} | Raised {seen['count']} times in {self.window:g}s")
+                await seen["message"].edit(embeds=seen["embeds"])
+
+    async def _summarize(self) -> None:
+        """Report how many errors were dropped while the queue was full"""
+
+        dropped, self.dropped = self.dropped, 0
+
+        em = Embed(
+            color=Colour.red(),
+            title="Errors dropped",
+            description=f"{dropped} error{'s' if dropped != 1 else ''} dropped while the error log was backed up"
+        )
+        await self._deliver([em])
+
+    @staticmethod
+    async def em_tb(error: Union[Exception, DiscordException], ctx: Context = None, event: str = None) -> Embed:
+        if ctx:
+            prefix = await ctx.bot.get_prefix(ctx.message)
+            title = f"In {prefix}{ctx.command.qualified_name}"
+            description = f"**{error.__class__.__name__}**: {error}"
+        else:
+            title = f"Exception ignored in event `{event}`" if event else None
+            description = f"**{type(error).__name__}**: {str(error)}"
+
+        stack = extract_tb(error.__traceback__)
+        tb_fields = [
+            {
+                "name": f"{ZWSP}\n__{fn}__",
+                "value": f"Line `{ln}` in `{func}`:\n```py\n{txt}\n```",
+                "inline": False
+            } for fn, ln, func, txt in stack
+        ]
+
+        em = Embed(color=Colour.red(), title=title, description=f"{description}")
+
+        for field in tb_fields:
+            em.add_field(**field)
+
+        return em
+
+
+class Bot(DiscordBot):
+
+    def __init__(self, **kwargs):
+
+        # Redis db instance made available to cogs
+        self.db: AsyncSubRedis = kwargs.pop("db", None)
+
+        # Name of bot stored in Bot instance
+        # Used as key name for db
+        self.APP_NAME: str = kwargs.pop("app_name", None)
+
+        # Legacy compatibility for Help command
+        self.dm_help: bool = kwargs.pop('dm_help', False) or kwargs.pop('pm_help', False)
+        self.pm_help: bool = self.dm_help
+
+        # Used by timer cog
+        self.secs: int = 0
+
+        # Declaring first. This will not be able to get set until login
+        self.app_info: AppInfo = kwargs.get("app_info", None)
+
+        # Dict to store custom presence Activity and Status
+        self.presence = {"activity": None, "status": None}
+
+        # Get the channel ready for errorlog
+        # Bot.get_channel method not available until on_ready
+        self.errorlog_channel: int = kwargs.pop("errorlog", None)
+        self.errorlog: ErrorLog = kwargs.get("errorlog", None)
+
+        # Webhook URLs to send error reports and mention notifications through, optional
+        self.errorlog_webhook: str = kwargs.pop("errorlog_webhook", None)
+        self.notifications_webhook: str = kwargs.pop("notifications_webhook", None)
+
+        # HTTP session shared by webhook transports. Opened on first use
+        self.session: Optional[ClientSession] = None
+
+        # Paced, packed sending of multi-message output. Use instead of looping over ctx.send
+        self.outbox: MessageScheduler = MessageScheduler()
+
+        # Supress IDE errors
+        self.send_help_for = None
+
+        # In-memory prefix index. Used as the command_prefix if one is not given
+        self.prefixes: PrefixResolver = kwargs.pop("prefixes", None)
+
+        # In-memory sudoer index used by utils.checks
+        self.permissions: PermissionIndex = kwargs.pop("permissions", None)
+
+        # Changed signature from arg to kwarg so I can splat the hgetall from db in main.py
+        command_prefix: str = kwargs.pop("command_prefix", self.prefixes or "!")
+
+        super().__init__(command_prefix, **kwargs)
+
+    def run(self, **kwargs):
+        # Changed signature from arg to kwarg so I can splat the hgetall from db in main.py
+        token = kwargs.pop("token", None)
+        if not token:
+            raise LoginFailure("No or improper token passed")
+        super().run(token, **kwargs)
+
+    async def _run_event(self, coro, event_name: str, *args, **kwargs):
+        # Override built-in event handler so we can capture errors raised
+        try:
+            await coro(*args, **kwargs)
+        except CancelledError:
+            pass
+        except Exception as error:
+            try:
+                await self.on_error(event_name, *args, error_captured=error, **kwargs)
+            except CancelledError:
+                pass
+
+    async def on_error(self, event_name, *args, **kwargs):
+        """Error handler for Exceptions raised in events"""
+
+        # Try to get Exception that was raised
+        error = kwargs.pop("error_captured")
+
+        # If the Exception raised is successfully captured, use ErrorLog
+        if error:
+            await self.errorlog.send(error, event=event_name)
+
+        # Otherwise, use default handler
+        else:
+            await super().on_error(event_method=event_name, *args, **kwargs)
+
+    def get_session(self) -> ClientSession:
+        """The bot's HTTP session, opened if it isn't already"""
+
+        if self.session is None or self.session.closed:
+            self.session = ClientSession()
+
+        return self.session
+
+    async def close(self):
+        await super().close()
+
+        if self.session is not None:
+            await self.session.close()
+
+    def change_presence(self, *, activity=None, status=None, afk=False):
+        """Override so we can capture the presences and store them"""
+
+        if activity:
+            self.presence["activity"] = activity
+
+        if status:
+            self.presence["status"] = status
+
+        return super().change_presence(activity=activity, status=status, afk=afk)
+
+
+class RedisCache:
+    """Bounded LRU cache of Redis replies with per-key TTL
+
+    Entries are stored by full key name and the arguments of the read
+    that produced them, so every entry for a key can be invalidated at
+    once when a write touches it"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        # Per-key TTL overrides, by full key name
+        self.ttls: Dict[str, float] = dict()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        # (key, command, *args) -> (expiry, value), oldest first
+        self._entries: OrderedDict[Tuple, Tuple[float, Any]] = OrderedDict()
+
+        # key -> entries currently cached for it
+        self._index: Dict[str, Set[Tuple]] = dict()
+
+        # key -> times its entries were invalidated, and times the whole cache was cleared.
+        # A read only caches its reply if neither changed while it was in flight
+        self._generations: Dict[str, int] = dict()
+        self._epoch: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set_ttl(self, key: str, ttl: float) -> None:
+        """Override the TTL in seconds for entries of ``key``"""
+        self.ttls[key] = ttl
+
+    def get(self, entry: Tuple) -> Tuple[bool, Any]:
+        """Returns whether ``entry`` was cached and its value if so"""
+
+        cached = self._entries.get(entry)
+
+        if cached is None:
+            self.misses += 1
+            return False, None
+
+        expiry, value = cached
+        if expiry < monotonic():
+            self._drop(entry)
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(entry)
+        self.hits += 1
+
+        # Hand out copies so callers can't mutate what is cached
+        return True, copy(value)
+
+    def generation(self, key: str) -> Tuple[int, int]:
+        """Changes whenever entries for ``key`` are invalidated. Taken before a read is sent"""
+        return self._epoch, self._generations.get(key, 0)
+
+    def put(self, entry: Tuple, value: Any, generation: Tuple[int, int] = None) -> None:
+        """Cache ``value`` as the reply for ``entry``
+
+        With the ``generation`` taken before the read, the reply is not
+        cached if a write invalidated the key while the read was in flight"""
+
+        key = entry[0]
+
+        if generation is not None and generation != self.generation(key):
+            return
+
+        self._entries[entry] = (monotonic() + self.ttls.get(key, self.ttl), copy(value))
+        self._entries.move_to_end(entry)
+        self._index.setdefault(key, set()).add(entry)
+
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, *keys: str) -> None:
+        """Drop every cached entry for ``keys``"""
+        for key in keys:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            for entry in self._index.pop(key, ()):
+                self._entries.pop(entry, None)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._generations.clear()
+        self._entries.clear()
+        self._index.clear()
+
+    def info(self) -> Dict[str, Any]:
+        """Counters for inspecting from the REPL"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def _drop(self, entry: Tuple) -> None:
+        self._entries.pop(entry, None)
+        entries = self._index.get(entry[0])
+        if entries:
+            entries.discard(entry)
+            if not entries:
+                del self._index[entry[0]]
+
+
+class RedisStats:
+    """Fixed-memory per-command latency and hot key counters
+
+    Latencies go into log2 histograms of microseconds, so each command
+    costs a fixed number of buckets however many calls are recorded.
+    Hot keys are tracked per namespace with the Space-Saving algorithm,
+    keeping at most ``top_keys`` counters per namespace."""
+
+    # Bucket i counts calls taking [2 ** i, 2 ** (i + 1)) microseconds
+    BUCKETS = 32
+
+    # Commands whose first argument is not a key. Subcommands, like "SCRIPT LOAD", go by their first word
+    KEYLESS = {
+        "SCAN", "PING", "ECHO", "INFO", "SELECT", "AUTH", "HELLO", "CLIENT", "CONFIG", "DBSIZE", "KEYS", "RANDOMKEY",
+        "SCRIPT", "FUNCTION", "FLUSHDB", "FLUSHALL", "OBJECT", "SLOWLOG", "COMMAND", "CLUSTER", "TIME", "LASTSAVE",
+        "SAVE", "BGSAVE", "BGREWRITEAOF", "WAIT", "MULTI", "EXEC", "DISCARD", "UNWATCH", "PUBLISH", "SUBSCRIBE",
+        "PSUBSCRIBE", "UNSUBSCRIBE", "PUNSUBSCRIBE", "PUBSUB", "READONLY", "READWRITE", "SENTINEL", "ROLE",
+    }
+
+    def __init__(self, top_keys: int = 16, max_namespaces: int = 64, depth: int = 2):
+        self.enabled: bool = True
+
+        self.top_keys = top_keys
+        self.max_namespaces = max_namespaces
+
+        # Number of key segments that make up a namespace, `SESTREN:config` at 2
+        self.depth = depth
+
+        # command -> [count, total seconds, histogram]
+        self.commands: Dict[str, List] = dict()
+
+        # namespace -> {key: (count, overestimate)}
+        self.keys: Dict[str, Dict[str, Tuple[int, int]]] = dict()
+
+        # Reads answered by an identical read already in flight, saving a command
+        self.coalesced: int = 0
+
+    def key_of(self, args: Tuple) -> Optional[str]:
+        """The key a command operates on, if any"""
+
+        command = args[0]
+
+        if command in ("EVAL", "EVALSHA"):
+            return args[3] if len(args) > 3 and int(args[2]) else None
+
+        # redis-py sends subcommands as one argument with their command
+        if isinstance(command, str) and " " in command:
+            command = command.split(" ", 1)[0]
+
+        if command in self.KEYLESS or len(args) < 2 or not isinstance(args[1], str):
+            return None
+
+        return args[1]
+
+    def record(self, args: Tuple, elapsed: float) -> None:
+        """Record one call of the command in ``args`` taking ``elapsed`` seconds"""
+
+        command = str(args[0]).upper()
+
+        stat = self.commands.get(command)
+        if stat is None:
+            stat = self.commands[command] = [0, 0.0, [0] * self.BUCKETS]
+
+        stat[0] += 1
+        stat[1] += elapsed
+        stat[2][min(max(int(elapsed * 1_000_000), 1).bit_length() - 1, self.BUCKETS - 1)] += 1
+
+        key = self.key_of(args)
+        if key is not None:
+            self.record_key(key)
+
+    def record_key(self, key: str) -> None:
+        """Count one access to ``key`` in its namespace"""
+
+        namespace = ":".join(key.split(":", self.depth)[:self.depth])
+
+        counters = self.keys.get(namespace)
+        if counters is None:
+            if len(self.keys) >= self.max_namespaces:
+                namespace = "::other"
+                counters = self.keys.setdefault(namespace, dict())
+            else:
+                counters = self.keys[namespace] = dict()
+
+        if key in counters:
+            count, error = counters[key]
+            counters[key] = (count + 1, error)
+
+        elif len(counters) < self.top_keys:
+            counters[key] = (1, 0)
+
+        else:
+            # Space-Saving: the new key replaces the least counted one
+            # and inherits its count as the maximum overestimate
+            least = min(counters, key=lambda k: counters[k][0])
+            count, _ = counters.pop(least)
+            counters[key] = (count + 1, count)
+
+    def percentile(self, command: str, percent: float) -> float:
+        """Upper bound in seconds of the ``percent`` percentile latency of ``command``"""
+
+        stat = self.commands.get(command.upper())
+        if not stat or not stat[0]:
+            return 0.0
+
+        target = stat[0] * percent / 100
+        seen = 0
+        for i, count in enumerate(stat[2]):
+            seen += count
+            if seen >= target:
+                return (2 ** (i + 1)) / 1_000_000
+
+        return (2 ** self.BUCKETS) / 1_000_000
+
+    def top(self, namespace: str = None, n: int = 10) -> List[Tuple[str, int]]:
+        """Hottest keys in ``namespace``, or across all namespaces"""
+
+        if namespace:
+            counters = self.keys.get(namespace, dict()).items()
+        else:
+            counters = [item for counters in self.keys.values() for item in counters.items()]
+
+        return [(key, count) for key, (count, _) in sorted(counters, key=lambda i: i[1][0], reverse=True)[:n]]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-command count, mean, p50 and p99 latency in seconds"""
+        return {
+            command: {
+                "count": count,
+                "mean": total / count if count else 0.0,
+                "p50": self.percentile(command, 50),
+                "p99": self.percentile(command, 99)
+            } for command, (count, total, _) in sorted(self.commands.items(), key=lambda i: i[1][0], reverse=True)
+        }
+
+    def reset(self) -> None:
+        self.commands.clear()
+        self.keys.clear()
+        self.coalesced = 0
+
+
+class RedisSchema:
+    """Declared value types for keys and hash fields
+
+    Maps full key names or glob patterns to either a single type, used
+    for string values and list or set members, or a dict of hash field
+    names to types. A "*" field sets the type of undeclared fields.
+
+    Types may be str, int, float, bool or "json". Replies for keys
+    without a declaration, and str values, are returned untouched."""
+
+    # Value type -> decoder, None for values returned as stored
+    DECODERS = {
+        str: None,
+        int: int,
+        float: float,
+        bool: bool_str,
+        "json": loads
+    }
+
+    # Commands whose replies are decoded
+    COMMANDS = {"GET", "HGET", "HGETALL", "HMGET", "LRANGE", "LINDEX", "SMEMBERS"}
+
+    def __init__(self, schema: Dict[str, Union[type, str, Dict[str, Union[type, str]]]]):
+        self.exact: Dict[str, Any] = dict()
+        self.patterns: List[Tuple[str, Any]] = list()
+
+        for key, spec in schema.items():
+            if isinstance(spec, dict):
+                spec = {field: self.DECODERS[t] for field, t in spec.items()}
+            else:
+                spec = self.DECODERS[spec]
+
+            if any(c in key for c in "*?["):
+                self.patterns.append((key, spec))
+            else:
+                self.exact[key] = spec
+
+        # Resolved specs for keys matched against patterns
+        self._resolved: Dict[str, Any] = dict()
+
+    def spec(self, key: str) -> Any:
+        """The declared spec for ``key``, or None"""
+
+        # Cluster hash tags are not part of the declared names
+        if "{" in key:
+            key = key.replace("{", "").replace("}", "")
+
+        if key in self.exact:
+            return self.exact[key]
+
+        if key not in self._resolved:
+            if len(self._resolved) >= 4096:
+                self._resolved.clear()
+            self._resolved[key] = next((spec for pattern, spec in self.patterns if fnmatchcase(key, pattern)), None)
+
+        return self._resolved[key]
+
+    @staticmethod
+    def _apply(decoder: Optional[Callable], value: Any) -> Any:
+        if decoder is None or value is None:
+            return value
+        try:
+            return decoder(value)
+        except ValueError:
+            return value
+
+    def decode(self, args: Tuple, reply: Any) -> Any:
+        """Decode ``reply`` to the command in ``args`` by the declared schema"""
+
+        command = args[0]
+
+        if command not in self.COMMANDS or len(args) < 2:
+            return reply
+
+        spec = self.spec(args[1])
+        if spec is None:
+            return reply
+
+        if isinstance(spec, dict):
+            default = spec.get("*")
+
+            if command == "HGET":
+                return self._apply(spec.get(args[2], default), reply)
+
+            elif command == "HGETALL":
+                for field, value in reply.items():
+                    decoder = spec.get(field, default)
+                    if decoder is not None:
+                        reply[field] = self._apply(decoder, value)
+                return reply
+
+            elif command == "HMGET":
+                return [self._apply(spec.get(field, default), value) for field, value in zip(args[2:], reply)]
+
+            return reply
+
+        if command in ("GET", "LINDEX"):
+            return self._apply(spec, reply)
+
+        elif command == "LRANGE":
+            return [self._apply(spec, value) for value in reply]
+
+        elif command == "SMEMBERS":
+            return {self._apply(spec, value) for value in reply}
+
+        return reply
+
+
+def decode_reply(schema: Optional[RedisSchema], args: Tuple, reply: Any) -> Any:
+    """Decode a reply by ``schema``, or bool transform it if there is none"""
+
+    # Errors are returned in place of replies by pipelines not raising them
+    if isinstance(reply, Exception):
+        return reply
+
+    if schema is not None:
+        return schema.decode(args, reply)
+
+    if args[0] in Redis.command_list:
+        return bool_transform(reply)
+
+    return reply
+
+
+class RedisSnapshot:
+    """Last known values of keys, kept in a local file
+
+    Fed with every successful read reply matching ``match``, and read back
+    by CircuitBreaker while Redis is unreachable. Hashes are merged field
+    by field so an HGET can be answered from an earlier HGETALL. Sets,
+    lists and strings are kept whole. Values are stored as Redis returned
+    them, before schema decoding."""
+
+    def __init__(self, path: str = None, match: Tuple[str, ...] = ("*",), interval: float = 30.0):
+        self.path = path
+        self.match = match
+
+        # Least seconds between writes of the file
+        self.interval = interval
+
+        self.hashes: Dict[str, Dict[str, str]] = dict()
+
+        # Key -> whole set, list or string
+        self.values: Dict[str, Any] = dict()
+
+        self._dirty: bool = False
+        self._saved: float = monotonic()
+
+        if path and exists(path):
+            with open(path, "r", encoding="utf8") as fp:
+                data = load(fp)
+            self.hashes = data.get("hashes", dict())
+            self.values = {key: set(value) if data_type == "set" else value for key, (data_type, value) in data.get("values", dict()).items()}
+
+        if path:
+            atexit.register(self.save)
+
+    def _matches(self, key: Any) -> bool:
+
+        # Commands like SCAN take a cursor, not a key
+        if not isinstance(key, str):
+            return False
+
+        # Cluster hash tags are not part of the configured patterns
+        key = key.replace("{", "").replace("}", "")
+        return any(fnmatchcase(key, pattern) for pattern in self.match)
+
+    def remember(self, args: Tuple, reply: Any) -> None:
+        """Record a successful read reply"""
+
+        command = args[0]
+
+        if len(args) < 2 or isinstance(reply, Exception) or not self._matches(args[1]):
+            return
+
+        key = args[1]
+
+        if command == "HGETALL":
+            self.hashes[key] = dict(reply)
+        elif command == "HGET":
+            if reply is None:
+                self.hashes.get(key, dict()).pop(args[2], None)
+            else:
+                self.hashes.setdefault(key, dict())[args[2]] = reply
+        elif command == "HMGET":
+            self.hashes.setdefault(key, dict()).update({f: v for f, v in zip(args[2:], reply) if v is not None})
+        elif command == "SMEMBERS":
+            self.values[key] = set(reply)
+        elif command == "GET":
+            self.values[key] = reply
+        elif command == "LRANGE" and int(args[2]) == 0 and int(args[3]) == -1:
+            self.values[key] = list(reply)
+        else:
+            return
+
+        self._dirty = True
+        if monotonic() - self._saved >= self.interval:
+            self.save()
+
+    def lookup(self, args: Tuple) -> Tuple[bool, Any]:
+        """``(found, reply)`` for a read, from the last known values"""
+
+        command = args[0]
+        key = args[1] if len(args) > 1 else None
+
+        if key in self.hashes:
+            mapping = self.hashes[key]
+
+            if command == "HGETALL":
+                return True, dict(mapping)
+            elif command == "HGET":
+                return True, mapping.get(args[2])
+            elif command == "HMGET":
+                return True, [mapping.get(field) for field in args[2:]]
+            elif command == "HKEYS":
+                return True, list(mapping.keys())
+            elif command == "HVALS":
+                return True, list(mapping.values())
+            elif command == "HEXISTS":
+                return True, args[2] in mapping
+
+        elif key in self.values:
+            value = self.values[key]
+
+            if command == "GET":
+                return True, value
+            elif command == "SMEMBERS":
+                return True, set(value)
+            elif command == "SISMEMBER":
+                return True, args[2] in value
+            elif command == "SCARD":
+                return True, len(value)
+            elif command == "LRANGE":
+                end = int(args[3])
+                return True, value[int(args[2]):None if end == -1 else end + 1]
+
+        return False, None
+
+    def save(self) -> None:
+        """Write the snapshot file if anything changed"""
+
+        self._saved = monotonic()
+
+        if not self._dirty or not self.path:
+            return
+
+        values = {
+            key: ("set", list(value)) if isinstance(value, set) else ("list" if isinstance(value, list) else "string", value)
+            for key, value in self.values.items()
+        }
+
+        with open(f"{self.path}.tmp", "w", encoding="utf8") as fp:
+            dump({"hashes": self.hashes, "values": values}, fp)
+        replace(f"{self.path}.tmp", self.path)
+
+        self._dirty = False
+
+
+class CircuitBreaker:
+    """Fails fast while Redis is unreachable instead of stalling every caller
+
+    After ``threshold`` consecutive timeouts or connection errors the
+    circuit opens. While open, reads are answered from ``snapshot`` and
+    writes are queued, up to ``max_pending``. A single probe is let through
+    after ``backoff`` seconds, doubling up to ``max_backoff`` each time it
+    fails. When a call succeeds again the circuit closes and the queued
+    writes are sent in order, by one caller at a time, ahead of the next
+    command.
+
+    Only writes that certainly never reached Redis are queued. A write that
+    fails after it may have been sent, like on a timeout, raises instead of
+    risking being applied twice, as does any failed write while the circuit
+    is still closed.
+
+    Queued writes reply None. Reads the snapshot cannot answer, and writes
+    when the queue is full, raise CircuitOpenError.
+
+    Commands sent inside `bypass` skip the breaker and its timeout. Writes
+    sent inside `unqueued` raise CircuitOpenError instead of being queued."""
+
+    # Errors that count as Redis being unreachable
+    FAILURES = (RedisConnectionError, RedisTimeoutError, AsyncTimeoutError, OSError)
+
+    # Messages of failures raised before a command was written to the socket
+    UNSENT = ("connecting to", "Too many connections", "No connection available")
+
+    # Commands served from the snapshot instead of queued while open
+    READS = {
+        "GET", "HGET", "HGETALL", "HMGET", "HKEYS", "HVALS", "HEXISTS", "HLEN", "SMEMBERS", "SISMEMBER",
+        "SCARD", "LRANGE", "LINDEX", "LLEN", "ZRANGE", "ZREVRANGE", "ZSCORE", "EXISTS", "TYPE", "SCAN", "PTTL", "TTL",
+        "PING",
+    }
+
+    # Set by `bypass` and `unqueued` for the task or thread they are entered in
+    _bypassed: ContextVar = ContextVar("bypassed", default=False)
+    _unqueued: ContextVar = ContextVar("unqueued", default=False)
+
+    def __init__(self, snapshot: RedisSnapshot = None, timeout: float = 0.5, threshold: int = 3,
+                 backoff: float = 1.0, max_backoff: float = 60.0, max_pending: int = 10000):
+        self.snapshot: RedisSnapshot = snapshot or RedisSnapshot()
+
+        # Seconds an asyncio call may take before it counts as a failure
+        self.timeout = timeout
+
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        # Writes waiting for the connection to return, oldest first
+        self.max_pending = max_pending
+        self.pending: Deque[Tuple[Tuple, Dict[str, Any]]] = deque()
+
+        # Pending writes Redis rejected when they were replayed, with the error, newest last
+        self.dead: Deque[Tuple[Tuple, Dict[str, Any], BaseException]] = deque()
+
+        # Held while the pending writes are sent, so only one caller sends them
+        self._flushing = Lock()
+        self._flushing_async = AsyncLock()
+
+        self.failures: int = 0
+        self.opened_at: Optional[float] = None
+        self.retry_at: float = 0.0
+        self.probing: bool = False
+        self._backoff: float = backoff
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing else "open"
+
+    """ #######
+         State
+        ####### """
+
+    def _allow(self) -> bool:
+        """Whether a call may be sent to Redis now"""
+
+        if self.opened_at is None:
+            return True
+
+        if not self.probing and monotonic() >= self.retry_at:
+            self.probing = True
+            return True
+
+        return False
+
+    def _success(self, args: Tuple, reply: Any) -> None:
+        self.failures = 0
+
+        if self.opened_at is not None:
+            self.opened_at = None
+            self._backoff = self.backoff
+
+        if args[0] in self.READS:
+            self.snapshot.remember(args, reply)
+
+    def _failure(self) -> None:
+        self.failures += 1
+        now = monotonic()
+
+        if self.opened_at is not None:
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+            self.retry_at = now + self._backoff
+
+        elif self.failures >= self.threshold:
+            self.opened_at = now
+            self.retry_at = now + self._backoff
+
+    def _unsent(self, error: BaseException) -> bool:
+        """Whether a failure certainly happened before the command was written to Redis"""
+        return isinstance(error, (RedisConnectionError, RedisTimeoutError)) and any(
+            message in str(error) for message in self.UNSENT
+        )
+
+    def _degraded(self, args: Tuple, options: Dict[str, Any]) -> Any:
+        """Answer a call without Redis, while the circuit is open"""
+
+        if args[0] not in self.READS:
+            if self._unqueued.get():
+                raise CircuitOpenError(f"Redis is unreachable and {args[0]} needs its reply")
+
+            if len(self.pending) >= self.max_pending:
+                raise CircuitOpenError(f"Redis is unreachable and {len(self.pending)} writes are already queued")
+
+            # The server's script cache may not survive the outage
+            if args[0] == "EVALSHA" and args[1] in RedisScript.registry:
+                args = ("EVAL", RedisScript.registry[args[1]].script, *args[2:])
+
+            self.pending.append((args, options))
+            return None
+
+        found, reply = self.snapshot.lookup(args)
+        if not found:
+            raise CircuitOpenError(f"Redis is unreachable and {args[0]} {args[1:2]} has no snapshot value")
+
+        return reply
+
+    def _failed(self, commands: List[Tuple[Tuple, Dict[str, Any]]], error: BaseException, sent: bool) -> List[Any]:
+        """Answer commands whose send failed, or raise ``error`` if a write among them can't be answered
+
+        Reads fall back to the snapshot. Writes are queued only while the
+        circuit is open, and only if they never reached Redis"""
+
+        self._failure()
+
+        writes = any(args[0] not in self.READS for args, _ in commands)
+        if writes and (self.opened_at is None or (sent and not self._unsent(error))):
+            raise error
+
+        return [self._degraded(args, options) for args, options in commands]
+
+    """ #######
+         Calls
+        ####### """
+
+    @staticmethod
+    @contextmanager
+    def bypass() -> Generator[None, None, None]:
+        """Send the current task's or thread's commands straight to Redis
+
+        For bulk transfers, like dumps and restores, that can outlast the
+        timeout without Redis being unreachable. Other callers are unaffected"""
+
+        token = CircuitBreaker._bypassed.set(True)
+        try:
+            yield
+        finally:
+            CircuitBreaker._bypassed.reset(token)
+
+    @staticmethod
+    @contextmanager
+    def unqueued() -> Generator[None, None, None]:
+        """Raise CircuitOpenError for the current task's or thread's writes instead of queueing them
+
+        For writes whose reply is needed, since a queued write replies None"""
+
+        token = CircuitBreaker._unqueued.set(True)
+        try:
+            yield
+        finally:
+            CircuitBreaker._unqueued.reset(token)
+
+    def _flush(self, send: Callable) -> None:
+        """Send the pending writes, unless another caller is
+
+        Each write is taken off the queue before it is sent. If it fails
+        before reaching Redis it is put back, otherwise it is not retried.
+        A write Redis answers with an error goes to `dead`, the caller
+        that triggered the flush isn't failed for it"""
+
+        with self._flushing:
+            while self.pending:
+                args, options = self.pending.popleft()
+                try:
+                    send(*args, **options)
+                except self.FAILURES as error:
+                    if self._unsent(error):
+                        self.pending.appendleft((args, options))
+                    raise
+                except RedisError as error:
+                    self._rejected(args, options, error)
+
+    async def _flush_async(self, send: Callable) -> None:
+        """asyncio counterpart to `_flush`. Callers wait for a flush in progress to finish"""
+
+        async with self._flushing_async:
+            while self.pending:
+                args, options = self.pending.popleft()
+                try:
+                    await wait_for(send(*args, **options), self.timeout)
+                except self.FAILURES as error:
+                    if self._unsent(error):
+                        self.pending.appendleft((args, options))
+                    raise
+                except RedisError as error:
+                    self._rejected(args, options, error)
+
+    def run(self, send: Callable, *args, **options) -> Any:
+        """Send a command through the breaker with a blocking client
+
+        The blocking client has no per-call timeout of its own here,
+        set ``socket_timeout`` on it"""
+
+        if self._bypassed.get():
+            return send(*args, **options)
+
+        if not self._allow():
+            return self._degraded(args, options)
+
+        try:
+            try:
+                if self.pending or self._flushing.locked():
+                    self._flush(send)
+            except self.FAILURES as error:
+                return self._failed([(args, options)], error, sent=False)[0]
+
+            try:
+                ret = send(*args, **options)
+            except self.FAILURES as error:
+                return self._failed([(args, options)], error, sent=True)[0]
+
+        finally:
+            self.probing = False
+
+        self._success(args, ret)
+        return ret
+
+    async def run_async(self, send: Callable, *args, **options) -> Any:
+        """Send a command through the breaker with an asyncio client"""
+
+        if self._bypassed.get():
+            return await send(*args, **options)
+
+        if not self._allow():
+            return self._degraded(args, options)
+
+        try:
+            try:
+                if self.pending or self._flushing_async.locked():
+                    await self._flush_async(send)
+            except self.FAILURES as error:
+                return self._failed([(args, options)], error, sent=False)[0]
+
+            try:
+                ret = await wait_for(send(*args, **options), self.timeout)
+            except self.FAILURES as error:
+                return self._failed([(args, options)], error, sent=True)[0]
+
+        finally:
+            self.probing = False
+
+        self._success(args, ret)
+        return ret
+
+    def _finish(self, commands: List[Tuple[Tuple, Dict[str, Any]]], ret: List[Any]) -> List[Any]:
+        for (args, options), reply in zip(commands, ret):
+            self._success(args, reply)
+
+        return ret
+
+    def _rejected(self, args: Tuple, options: Dict[str, Any], error: BaseException) -> None:
+        """Set aside a pending write Redis answered with an error"""
+
+        if len(self.dead) >= self.max_pending:
+            self.dead.popleft()
+        self.dead.append((args, options, error))
+
+        print(f"| Dropped queued Redis write {args[0]}\n|   {type(error).__name__}: {error}")
+
+    def _replayed(self, commands: List[Tuple[Tuple, Dict[str, Any]]], flushed: List[Tuple[Tuple, Dict[str, Any]]],
+                  ret: List[Any], raise_on_error: bool) -> List[Any]:
+        """Split the replies of a pipeline that carried ``flushed`` pending writes ahead of ``commands``
+
+        The pipeline was executed without raising, so errors for the
+        pending writes go to `dead`. The first error for the pipeline's
+        own commands is raised here instead, if ``raise_on_error``"""
+
+        for (args, options), reply in zip(flushed, ret):
+            if isinstance(reply, Exception):
+                self._rejected(args, options, reply)
+
+        ret = self._finish(commands, ret[len(flushed):])
+
+        if raise_on_error:
+            for reply in ret:
+                if isinstance(reply, Exception):
+                    raise reply
+
+        return ret
+
+    def _take_pending(self, pipe: RedisPipeline) -> List[Tuple[Tuple, Dict[str, Any]]]:
+        """Move the pending writes to the front of ``pipe``"""
+
+        flushed = list(self.pending)
+        self.pending.clear()
+        pipe.requeue_commands(flushed)
+        return flushed
+
+    def _pipeline_failed(self, commands: List[Tuple[Tuple, Dict[str, Any]]], flushed: List[Tuple[Tuple, Dict[str, Any]]],
+                         error: BaseException) -> List[Any]:
+        """Handle a failed pipeline that carried ``flushed`` pending writes ahead of ``commands``"""
+
+        # Not sent at all, so nothing was applied. The pending writes go back in order
+        if self._unsent(error):
+            self.pending.extendleft(reversed(flushed))
+
+        elif flushed:
+            # The pending writes may have been applied, the pipeline's own commands too
+            self._failure()
+            raise error
+
+        return self._failed(commands, error, sent=True)
+
+    def run_pipeline(self, pipe: RedisPipeline, execute: Callable, raise_on_error: bool = True) -> List[Any]:
+        """Execute a pipeline through the breaker, answering each command degraded if it fails
+
+        Pending writes are sent at the front of the pipeline"""
+
+        if self._bypassed.get():
+            return execute(raise_on_error)
+
+        commands = pipe.queued_commands()
+
+        if not self._allow():
+            pipe.drop_commands()
+            return [self._degraded(args, options) for args, options in commands]
+
+        # Only serialized with other callers when there are pending writes to send
+        flushing = self._flushing if self.pending or self._flushing.locked() else nullcontext()
+
+        try:
+            with flushing:
+                flushed = self._take_pending(pipe)
+
+                try:
+                    ret = execute(raise_on_error and not flushed)
+                except self.FAILURES as error:
+                    return self._pipeline_failed(commands, flushed, error)
+
+        finally:
+            self.probing = False
+
+        return self._replayed(commands, flushed, ret, raise_on_error)
+
+    async def run_pipeline_async(self, pipe: RedisPipeline, execute: Callable, raise_on_error: bool = True) -> List[Any]:
+        """asyncio counterpart to `run_pipeline`"""
+
+        if self._bypassed.get():
+            return await execute(raise_on_error)
+
+        commands = pipe.queued_commands()
+
+        if not self._allow():
+            pipe.drop_commands()
+            return [self._degraded(args, options) for args, options in commands]
+
+        flushing = self._flushing_async if self.pending or self._flushing_async.locked() else nullcontext()
+
+        try:
+            async with flushing:
+                flushed = self._take_pending(pipe)
+
+                try:
+                    ret = await wait_for(execute(raise_on_error and not flushed), self.timeout)
+                except self.FAILURES as error:
+                    return self._pipeline_failed(commands, flushed, error)
+
+        finally:
+            self.probing = False
+
+        return self._replayed(commands, flushed, ret, raise_on_error)
+
+
+class RedisClient:
+    """What every client adds to the one it wraps
+
+    The schema replies are decoded by, the circuit breaker, the local
+    caches registered by SubRedis and the command stats. Sending through
+    `_run_command` applies all of them, and `_bind` hands them to a pipeline"""
+
+    def _init_client(self, schema: RedisSchema = None, breaker: CircuitBreaker = None) -> None:
+        self.schema: Optional[RedisSchema] = schema
+
+        # Degraded mode while the server is unreachable, if given
+        self.breaker: Optional[CircuitBreaker] = breaker
+
+        # Set on replicas without a breaker, to record read replies for their primary's breaker
+        self.snapshot: Optional[RedisSnapshot] = None
+
+        # Local caches registered by SubRedis, by namespace
+        self.caches: Dict[str, RedisCache] = dict()
+
+        # Latency and hot key counters for every command sent
+        self.stats: RedisStats = RedisStats()
+
+    def _run_command(self, send: Callable, *args, **options) -> Any:
+        """Send a command with ``send`` through the breaker, timing it and decoding its reply"""
+
+        if self.breaker is not None:
+            send = partial(self.breaker.run, send)
+        elif self.snapshot is not None:
+            send = partial(self._remembered, send)
+
+        if not self.stats.enabled:
+            return decode_reply(self.schema, args, send(*args, **options))
+
+        start = perf_counter()
+        try:
+            ret = send(*args, **options)
+        finally:
+            self.stats.record(args, perf_counter() - start)
+
+        return decode_reply(self.schema, args, ret)
+
+    def _remembered(self, send: Callable, *args, **options) -> Any:
+        ret = send(*args, **options)
+        self.snapshot.remember(args, ret)
+        return ret
+
+    def _bind(self, pipe: RedisPipeline) -> RedisPipeline:
+        pipe.schema = self.schema
+        pipe.stats = self.stats
+        pipe.breaker = self.breaker
+        return pipe
+
+
+class AsyncRedisClient(RedisClient):
+    """asyncio counterpart to RedisClient"""
+
+    async def _run_command(self, send: Callable, *args, **options) -> Any:
+        if self.breaker is not None:
+            send = partial(self.breaker.run_async, send)
+        elif self.snapshot is not None:
+            send = partial(self._remembered, send)
+
+        if not self.stats.enabled:
+            return decode_reply(self.schema, args, await send(*args, **options))
+
+        start = perf_counter()
+        try:
+            ret = await send(*args, **options)
+        finally:
+            self.stats.record(args, perf_counter() - start)
+
+        return decode_reply(self.schema, args, ret)
+
+    async def _remembered(self, send: Callable, *args, **options) -> Any:
+        ret = await send(*args, **options)
+        self.snapshot.remember(args, ret)
+        return ret
+
+
+class RedisPipeline:
+    """What every pipeline adds to the one it wraps
+
+    Replies are decoded from the results of `execute`, because
+    transactions never pass queued replies through parse_response.
+    Executing through `_run_pipeline` also goes through the breaker and
+    counts the pipeline and the keys it touched.
+
+    The queue hooks let the breaker work on any pipeline's command stack"""
+
+    schema: Optional[RedisSchema] = None
+    stats: Optional[RedisStats] = None
+    breaker: Optional[CircuitBreaker] = None
+
+    def queued_commands(self) -> List[Tuple[Tuple, Dict[str, Any]]]:
+        """The queued commands, as ``(args, options)``"""
+        return list(self.command_stack)
+
+    def requeue_commands(self, commands: List[Tuple[Tuple, Dict[str, Any]]]) -> None:
+        """Queue ``commands`` ahead of those already queued"""
+        self.command_stack[:0] = commands
+
+    def drop_commands(self) -> None:
+        """Drop the queued commands without sending them"""
+        self.command_stack = list()
+
+    def _record_pipeline(self, stack: List[Tuple], start: float) -> None:
+        if self.stats is None or not self.stats.enabled or not stack:
+            return
+
+        self.stats.record(("PIPELINE",), perf_counter() - start)
+        for args in stack:
+            key = self.stats.key_of(args)
+            if key is not None:
+                self.stats.record_key(key)
+
+    def _run_pipeline(self, execute: Callable, raise_on_error: bool = True) -> List[Any]:
+        """Run the queued commands with ``execute``"""
+
+        stack = [args for args, options in self.queued_commands()]
+
+        start = perf_counter()
+        if self.breaker is None:
+            ret = execute(raise_on_error)
+        else:
+            ret = self.breaker.run_pipeline(self, execute, raise_on_error)
+
+        self._record_pipeline(stack, start)
+        return [decode_reply(self.schema, args, r) for args, r in zip(stack, ret)]
+
+
+class AsyncRedisPipeline(RedisPipeline):
+    """asyncio counterpart to RedisPipeline"""
+
+    async def _run_pipeline(self, execute: Callable, raise_on_error: bool = True) -> List[Any]:
+        stack = [args for args, options in self.queued_commands()]
+
+        start = perf_counter()
+        if self.breaker is None:
+            ret = await execute(raise_on_error)
+        else:
+            ret = await self.breaker.run_pipeline_async(self, execute, raise_on_error)
+
+        self._record_pipeline(stack, start)
+        return [decode_reply(self.schema, args, r) for args, r in zip(stack, ret)]
+
+
+class Redis(RedisClient, DefaultRedis):
+    """Decodes replies by a declared RedisSchema
+
+    Without a schema, turns 'True' and 'False' values
+    returned by redis to bool values"""
+
+    # Bool transforms will be performed on these redis commands if there is no schema
+    command_list = ['HGET', 'HGETALL', 'GET', 'LRANGE']
+
+    def __init__(self, *args, schema: RedisSchema = None, breaker: CircuitBreaker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_client(schema, breaker)
+
+    def execute_command(self, *args, **options):
+        return self._run_command(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str = None) -> Pipeline:
+        return self._bind(Pipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint))
+
+    # Command, extra args and optional cast used to fetch each data type
+    dump_types = {
+        "string": ("get", tuple(), None),
+        "list": ("lrange", (0, -1), None),
+        "set": ("smembers", tuple(), list),
+        "zset": ("zrange", (0, -1, False, True), dict),
+        "hash": ("hgetall", tuple(), None)
+    }
+
+    def iter_dump(self, match: str = "*", count: int = 1000) -> Generator[Tuple[str, str, Any], None, None]:
+        """
+        Yield ``(key, type, value)`` for every key matching ``match``
+
+        Each SCAN batch costs two pipelined round trips, one for the
+        TYPE of every key and one to fetch every value, and is yielded
+        before the next batch is requested.
+
+        ``count`` is the SCAN batch size hint
+        """
+        cursor = 0
+
+        with self.pipeline(transaction=False) as pipe:
+            while True:
+                cursor, keys = self.scan(cursor, match=match, count=count)
+
+                if keys:
+                    yield from self._dump_batch(pipe, keys)
+
+                if not cursor:
+                    break
+
+    def _dump_batch(self, pipe: Pipeline, keys: List[str]) -> Generator[Tuple[str, str, Any], None, None]:
+        """Fetch the types, then the values, of ``keys`` in two round trips"""
+
+        for key in keys:
+            pipe.type(key)
+        data_types = pipe.execute()
+
+        # Keys removed since the SCAN report type "none" and are skipped
+        found = [(key, data_type) for key, data_type in zip(keys, data_types) if data_type in self.dump_types]
+
+        for key, data_type in found:
+            command, args, _ = self.dump_types[data_type]
+            getattr(pipe, command)(key, *args)
+
+        for (key, data_type), value in zip(found, pipe.execute()):
+            yield key, data_type, value
+
+    def to_dict(self, match: str = "*", cast_values: bool = False, include_types: bool = False) -> Dict[str: Any]:
+
+        mapping = dict()
+
+        if include_types:
+            mapping["::types"] = dict()
+
+        for key, data_type, value in self.iter_dump(match=match):
+
+            if include_types:
+                mapping["::types"][key] = data_type
+
+            cast_type = self.dump_types[data_type][2]
+
+            cursor = mapping
+
+            for ns in key.split(":"):
+                if ns not in cursor.keys():
+                    cursor[ns] = dict()
+                cursor = cursor[ns]
+
+            if cast_values and cast_type:
+                value = cast_type(value)
+
+            cursor[key] = value
+
+        return mapping
+
+    # def update(self, root_key: str, mapping: Dict[str: Union[str, list, set, dict, Tuple[str, int]]]):
+    #
+    #     for key, value in mapping.items():
+    #         self.zadd()
+
+
+class Pipeline(RedisPipeline, DefaultPipeline):
+    """Pipeline that returns the same decoded
+    replies as Redis"""
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        return self._run_pipeline(super().execute, raise_on_error)
+
+
+class AsyncRedis(AsyncRedisClient, DefaultAsyncRedis):
+    """asyncio counterpart to Redis
+
+    Decodes replies by a declared RedisSchema"""
+
+    # Bool transforms will be performed on these redis commands if there is no schema
+    command_list = Redis.command_list
+
+    # Command, extra args and optional cast used to fetch each data type
+    dump_types = Redis.dump_types
+
+    def __init__(self, *args, schema: RedisSchema = None, breaker: CircuitBreaker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_client(schema, breaker)
+
+    async def execute_command(self, *args, **options):
+        return await self._run_command(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str = None) -> AsyncPipeline:
+        return self._bind(AsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint))
+
+    async def iter_dump(self, match: str = "*", count: int = 1000) -> AsyncGenerator[Tuple[str, str, Any], None]:
+        """
+        Yield ``(key, type, value)`` for every key matching ``match``
+
+        Each SCAN batch costs two pipelined round trips, one for the
+        TYPE of every key and one to fetch every value, and is yielded
+        before the next batch is requested.
+
+        ``count`` is the SCAN batch size hint
+        """
+        cursor = 0
+
+        async with self.pipeline(transaction=False) as pipe:
+            while True:
+                cursor, keys = await self.scan(cursor, match=match, count=count)
+
+                if keys:
+                    async for record in self._dump_batch(pipe, keys):
+                        yield record
+
+                if not cursor:
+                    break
+
+    async def _dump_batch(self, pipe: AsyncPipeline, keys: List[str]) -> AsyncGenerator[Tuple[str, str, Any], None]:
+        """Fetch the types, then the values, of ``keys`` in two round trips"""
+
+        for key in keys:
+            pipe.type(key)
+        data_types = await pipe.execute()
+
+        # Keys removed since the SCAN report type "none" and are skipped
+        found = [(key, data_type) for key, data_type in zip(keys, data_types) if data_type in self.dump_types]
+
+        for key, data_type in found:
+            command, args, _ = self.dump_types[data_type]
+            getattr(pipe, command)(key, *args)
+
+        for (key, data_type), value in zip(found, await pipe.execute()):
+            yield key, data_type, value
+
+    async def to_dict(self, match: str = "*", cast_values: bool = False, include_types: bool = False) -> Dict[str: Any]:
+
+        mapping = dict()
+
+        if include_types:
+            mapping["::types"] = dict()
+
+        async for key, data_type, value in self.iter_dump(match=match):
+
+            if include_types:
+                mapping["::types"][key] = data_type
+
+            cast_type = self.dump_types[data_type][2]
+
+            cursor = mapping
+
+            for ns in key.split(":"):
+                if ns not in cursor.keys():
+                    cursor[ns] = dict()
+                cursor = cursor[ns]
+
+            if cast_values and cast_type:
+                value = cast_type(value)
+
+            cursor[key] = value
+
+        return mapping
+
+
+class AsyncPipeline(AsyncRedisPipeline, DefaultAsyncPipeline):
+    """asyncio counterpart to Pipeline"""
+
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        return await self._run_pipeline(super().execute, raise_on_error)
+
+
+class RedisCluster(RedisClient, DefaultRedisCluster):
+    """Redis for a Redis Cluster
+
+    A SubRedis built on it wraps the app namespace in a hash tag, so all
+    of the app's keys share one slot and batches and scripts touching
+    several of them are routed to a single node. SCAN based iteration
+    walks every primary."""
+
+    # Bool transforms will be performed on these redis commands if there is no schema
+    command_list = Redis.command_list
+
+    # Command, extra args and optional cast used to fetch each data type
+    dump_types = Redis.dump_types
+
+    _dump_batch = Redis._dump_batch
+    to_dict = Redis.to_dict
+
+    def __init__(self, *args, schema: RedisSchema = None, breaker: CircuitBreaker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_client(schema, breaker)
+
+    def execute_command(self, *args, **options):
+        return self._run_command(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = None, shard_hint: str = None) -> ClusterPipeline:
+        # Cluster pipelines cannot MULTI/EXEC, so ``transaction`` is ignored.
+        # Each command is still atomic, anything more needs a RedisScript
+        pipe = ClusterPipeline(
+            nodes_manager=self.nodes_manager,
+            commands_parser=self.commands_parser,
+            startup_nodes=self.nodes_manager.startup_nodes,
+            result_callbacks=self.result_callbacks,
+            cluster_response_callbacks=self.cluster_response_callbacks,
+            cluster_error_retry_attempts=self.cluster_error_retry_attempts,
+            read_from_replicas=self.read_from_replicas,
+            reinitialize_steps=self.reinitialize_steps,
+            lock=self._lock,
+        )
+        pipe.client = self
+        return self._bind(pipe)
+
+    def iter_dump(self, match: str = "*", count: int = 1000) -> Generator[Tuple[str, str, Any], None, None]:
+        """
+        Yield ``(key, type, value)`` for every key matching ``match``
+        on every primary
+
+        Keys are taken ``count`` at a time from `scan_iter` and fetched
+        like `Redis.iter_dump`
+        """
+        keys = list()
+
+        with self.pipeline() as pipe:
+            for key in self.scan_iter(match=match, count=count):
+                keys.append(key)
+
+                if len(keys) >= count:
+                    yield from self._dump_batch(pipe, keys)
+                    keys = list()
+
+            if keys:
+                yield from self._dump_batch(pipe, keys)
+
+
+class ClusterPipeline(RedisPipeline, DefaultClusterPipeline):
+    """Pipeline for RedisCluster returning the same decoded replies
+
+    Scripts queued by `RedisScript.run` are loaded on every primary
+    before executing, as cluster pipelines cannot load them"""
+
+    client: Optional[RedisCluster] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.scripts: Set[RedisScript] = set()
+
+    # The command stack holds PipelineCommands, ordered by position
+    def queued_commands(self) -> List[Tuple[Tuple, Dict[str, Any]]]:
+        return [(command.args, command.options) for command in self.command_stack]
+
+    def requeue_commands(self, commands: List[Tuple[Tuple, Dict[str, Any]]]) -> None:
+        self.command_stack[:0] = [PipelineCommand(args, options) for args, options in commands]
+        for position, command in enumerate(self.command_stack):
+            command.position = position
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        return self._run_pipeline(self._send_queued, raise_on_error)
+
+    def _send_queued(self, raise_on_error: bool = True) -> List[Any]:
+        for script in self.scripts:
+            self.client.script_load(script.script)
+        self.scripts.clear()
+
+        return super().execute(raise_on_error)
+
+
+class AsyncRedisCluster(AsyncRedisClient, DefaultAsyncRedisCluster):
+    """asyncio counterpart to RedisCluster"""
+
+    # Bool transforms will be performed on these redis commands if there is no schema
+    command_list = Redis.command_list
+
+    # Command, extra args and optional cast used to fetch each data type
+    dump_types = Redis.dump_types
+
+    _dump_batch = AsyncRedis._dump_batch
+    to_dict = AsyncRedis.to_dict
+
+    def __init__(self, *args, schema: RedisSchema = None, breaker: CircuitBreaker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_client(schema, breaker)
+
+    async def execute_command(self, *args, **options):
+        return await self._run_command(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction: bool = None, shard_hint: str = None) -> AsyncClusterPipeline:
+        # Cluster pipelines cannot MULTI/EXEC, so ``transaction`` is ignored.
+        # Each command is still atomic, anything more needs a RedisScript
+        return self._bind(AsyncClusterPipeline(self))
+
+    async def iter_dump(self, match: str = "*", count: int = 1000) -> AsyncGenerator[Tuple[str, str, Any], None]:
+        """
+        Yield ``(key, type, value)`` for every key matching ``match``
+        on every primary
+
+        Keys are taken ``count`` at a time from `scan_iter` and fetched
+        like `AsyncRedis.iter_dump`
+        """
+        keys = list()
+
+        async with self.pipeline() as pipe:
+            async for key in self.scan_iter(match=match, count=count):
+                keys.append(key)
+
+                if len(keys) >= count:
+                    async for record in self._dump_batch(pipe, keys):
+                        yield record
+                    keys = list()
+
+            if keys:
+                async for record in self._dump_batch(pipe, keys):
+                    yield record
+
+
+class AsyncClusterPipeline(AsyncRedisPipeline, DefaultAsyncClusterPipeline):
+    """asyncio counterpart to ClusterPipeline"""
+
+    def __init__(self, client: AsyncRedisCluster):
+        super().__init__(client)
+
+        self.scripts: Set[RedisScript] = set()
+
+    # The command stack holds PipelineCommands, in order
+    def queued_commands(self) -> List[Tuple[Tuple, Dict[str, Any]]]:
+        return [(command.args, command.kwargs) for command in self._command_stack]
+
+    def requeue_commands(self, commands: List[Tuple[Tuple, Dict[str, Any]]]) -> None:
+        self._command_stack[:0] = [AsyncPipelineCommand(0, *args, **options) for args, options in commands]
+        for position, command in enumerate(self._command_stack):
+            command.position = position
+
+    def drop_commands(self) -> None:
+        self._command_stack = list()
+
+    async def execute(self, raise_on_error: bool = True, allow_redirections: bool = True) -> List[Any]:
+        return await self._run_pipeline(partial(self._send_queued, allow_redirections=allow_redirections), raise_on_error)
+
+    async def _send_queued(self, raise_on_error: bool = True, allow_redirections: bool = True) -> List[Any]:
+        for script in self.scripts:
+            await self._client.script_load(script.script)
+        self.scripts.clear()
+
+        return await super().execute(raise_on_error, allow_redirections)
+
+
+class ReplicaReader(DataAccessCommands):
+    """Sends read commands to replicas of a primary in turn
+
+    A replica that fails to answer is skipped for ``cooldown`` seconds,
+    and reads go to the primary while every replica is down. Keys written
+    through SubRedis are read from the primary for ``lag`` seconds after,
+    so a write is never followed by a stale read from a lagging replica.
 
-                page: Embed = self.copy()
-                page.strip_head()
-                page.clear_fields()
-                page.strip_foot()
+    SCAN keeps to one replica, as cursors are only valid on the node
+    that returned them."""
 
-                page.add_field(
-                    name=field["name"],
-                    value=field["value"],
-                    inline=field["inline"]
-                )
+    def __init__(self, primary: Redis, replicas: List[Redis], cooldown: float = 5.0, lag: float = 1.0):
+        self.primary = primary
+        self.replicas = replicas
+        self.cooldown = cooldown
+        self.lag = lag
 
-        if page.head_len + len(page.fields_len) + self.foot_len < 6000:
-            page.set_footer(
-                text=self.footer.text,
-                icon_url=self.footer.icon_url
-            )
-            pages.append(page)
+        # Replicas share the primary's counters, and keep its breaker's snapshot current
+        for replica in replicas:
+            replica.stats = primary.stats
 
-        else:
-            pages.append(page)
+            if getattr(primary, "breaker", None) is not None:
+                replica.snapshot = primary.breaker.snapshot
 
-            page = self.copy()
-            page.strip_head()
-            page.clear_fields()
+        self._next: int = 0
 
-            pages.append(page)
+        # Replica index -> time it may be retried
+        self._down: Dict[int, float] = dict()
 
-        return pages
+        # Key -> time until which it is read from the primary
+        self._pinned: Dict[str, float] = dict()
 
+    def pin(self, *keys: str) -> None:
+        """Read ``keys`` from the primary until replicas have caught up"""
 
-class ErrorLog:
+        now = monotonic()
+        if len(self._pinned) >= 4096:
+            self._pinned = {key: until for key, until in self._pinned.items() if until > now}
 
-    def __init__(self, bot, channel: Union[int, str, TextChannel]):
-        self.bot = bot
-        if isinstance(channel, int):
-            channel = self.bot.get_channel(channel)
-        elif isinstance(channel, str):
-            channel = self.bot.get_channel(int(channel))
-        if isinstance(channel, TextChannel):
-            self.channel = channel
-        else:
-            self.channel = None
+        for key in keys:
+            self._pinned[key] = now + self.lag
 
-    async def send(self, error: Union[Exception, DiscordException], ctx: Context = None, event: str = None) -> Message:
-        if not self.channel:
-            raise AttributeError("ErrorLog channel not set")
-        em = await self.em_tb(error, ctx, event)
-        for i, page in enumerate(em.split()):
-            if i:
-                await sleep(0.1)
-            return await self.channel.send(embed=em)
+    def _candidates(self, args: Tuple) -> List[Tuple[int, Redis]]:
+        """Replicas to try for ``args``, in order"""
 
-    @staticmethod
-    async def em_tb(error: Union[Exception, DiscordException], ctx: Context = None, event: str = None) -> Embed:
-        if ctx:
-            prefix = await ctx.bot.get_prefix(ctx.message)
-            title = f"In {prefix}{ctx.command.qualified_name}"
-            description = f"**{error.__class__.__name__}**: {error}"
-        else:
-            title = f"Exception ignored in event `{event}`" if event else None
-            description = f"**{type(error).__name__}**: {str(error)}"
+        now = monotonic()
 
-        stack = extract_tb(error.__traceback__)
-        tb_fields = [
-            {
-                "name": f"{ZWSP}\n__{fn}__",
-                "value": f"Line `{ln}` in `{func}`:\n```py\n{txt}\n```",
-                "inline": False
-            } for fn, ln, func, txt in stack
-        ]
+        if len(args) > 1 and self._pinned.get(args[1], 0) > now:
+            return list()
 
-        em = Embed(color=Colour.red(), title=title, description=f"{description}")
+        up = [i for i in range(len(self.replicas)) if self._down.get(i, 0) <= now]
 
-        for field in tb_fields:
-            em.add_field(**field)
+        if up and args[0] != "SCAN":
+            self._next = (self._next + 1) % len(up)
+            up = up[self._next:] + up[:self._next]
 
-        return em
+        return [(i, self.replicas[i]) for i in up]
 
+    def execute_command(self, *args, **options):
+        for i, replica in self._candidates(args):
+            try:
+                return replica.execute_command(*args, **options)
+            except (RedisConnectionError, RedisTimeoutError):
+                self._down[i] = monotonic() + self.cooldown
 
-class Bot(DiscordBot):
+        return self.primary.execute_command(*args, **options)
 
-    def __init__(self, **kwargs):
 
-        # Redis db instance made available to cogs
-        self.db: SubRedis = kwargs.pop("db", None)
+class AsyncReplicaReader(AsyncDataAccessCommands):
+    """asyncio counterpart to ReplicaReader"""
 
-        # Name of bot stored in Bot instance
-        # Used as key name for db
-        self.APP_NAME: str = kwargs.pop("app_name", None)
+    __init__ = ReplicaReader.__init__
+    pin = ReplicaReader.pin
+    _candidates = ReplicaReader._candidates
 
-        # Legacy compatibility for Help command
-        self.dm_help: bool = kwargs.pop('dm_help', False) or kwargs.pop('pm_help', False)
-        self.pm_help: bool = self.dm_help
+    async def execute_command(self, *args, **options):
+        for i, replica in self._candidates(args):
+            try:
+                return await replica.execute_command(*args, **options)
+            except (RedisConnectionError, RedisTimeoutError):
+                self._down[i] = monotonic() + self.cooldown
 
-        # Used by timer cog
-        self.secs: int = 0
+        return await self.primary.execute_command(*args, **options)
 
-        # Declaring first. This will not be able to get set until login
-        self.app_info: AppInfo = kwargs.get("app_info", None)
 
-        # Dict to store custom presence Activity and Status
-        self.presence = {"activity": None, "status": None}
+class RedisScript:
+    """Lua script run atomically by its SHA, loaded on first use
 
-        # Get the channel ready for errorlog
-        # Bot.get_channel method not available until on_ready
-        self.errorlog_channel: int = kwargs.pop("errorlog", None)
-        self.errorlog: ErrorLog = kwargs.get("errorlog", None)
+    ``local`` is the same operation written in Python, for backends that
+    cannot run Lua. It is called as ``local(client, keys, args)``."""
 
-        # Supress IDE errors
-        self.send_help_for = None
+    # SHA to script, for backends looking up ``local``
+    registry: Dict[str, RedisScript] = dict()
 
-        # Changed signature from arg to kwarg so I can splat the hgetall from db in main.py
-        command_prefix: str = kwargs.pop("command_prefix", "!")
+    def __init__(self, script: str, local: Callable = None):
+        self.script = script
+        self.sha = sha1(script.encode("utf8")).hexdigest()
+        self.local = local
 
-        super().__init__(command_prefix, **kwargs)
+        self.registry[self.sha] = self
 
-    def run(self, **kwargs):
-        # Changed signature from arg to kwarg so I can splat the hgetall from db in main.py
-        token = kwargs.pop("token", None)
-        if not token:
-            raise LoginFailure("No or improper token passed")
-        super().run(token, **kwargs)
+    def run(self, client: Union[Redis, Pipeline, AsyncPipeline], numkeys: int, *keys_and_args) -> Any:
+        """EVALSHA on ``client``, loading the script if the server does not have it"""
+
+        # Pipelines check for and load their scripts before executing.
+        # Cluster pipelines block evalsha(), so the command is queued directly
+        if isinstance(client, (DefaultPipeline, DefaultAsyncPipeline, ClusterPipeline, AsyncClusterPipeline)):
+            client.scripts.add(self)
+            return client.execute_command("EVALSHA", self.sha, numkeys, *keys_and_args)
 
-    async def _run_event(self, coro, event_name: str, *args, **kwargs):
-        # Override built-in event handler so we can capture errors raised
         try:
-            await coro(*args, **kwargs)
-        except CancelledError:
-            pass
-        except Exception as error:
-            try:
-                await self.on_error(event_name, *args, error_captured=error, **kwargs)
-            except CancelledError:
-                pass
+            return client.evalsha(self.sha, numkeys, *keys_and_args)
+        except NoScriptError:
+            client.script_load(self.script)
+            return client.evalsha(self.sha, numkeys, *keys_and_args)
 
-    async def on_error(self, event_name, *args, **kwargs):
-        """Error handler for Exceptions raised in events"""
+    async def run_async(self, client: AsyncRedis, numkeys: int, *keys_and_args) -> Any:
+        """EVALSHA on an asyncio ``client``, loading the script if the server does not have it"""
 
-        # Try to get Exception that was raised
-        error = kwargs.pop("error_captured")
+        try:
+            return await client.evalsha(self.sha, numkeys, *keys_and_args)
+        except NoScriptError:
+            await client.script_load(self.script)
+            return await client.evalsha(self.sha, numkeys, *keys_and_args)
 
-        # If the Exception raised is successfully captured, use ErrorLog
-        if error:
-            await self.errorlog.send(error, event=event_name)
 
-        # Otherwise, use default handler
-        else:
-            await super().on_error(event_method=event_name, *args, **kwargs)
+class SubRedis:
 
-    def change_presence(self, *, activity=None, status=None, afk=False):
-        """Override so we can capture the presences and store them"""
+    def __init__(self, db: Union[Redis, SubRedis], basekey: str, cache: RedisCache = None, reader: ReplicaReader = None):
 
-        if activity:
-            self.presence["activity"] = activity
+        if isinstance(db, SubRedis):
+            self.root = db.root
+            self.reader = db.reader
+            self.basekey = f"{db.basekey}:{basekey}"
 
-        if status:
-            self.presence["status"] = status
+        else:
+            self.root = db
 
-        return super().change_presence(activity=activity, status=status, afk=afk)
+            # Read-only commands go to ``reader`` if given, writes always to ``db``
+            self.reader = reader or db
 
+            # On a cluster the app namespace is a hash tag, keeping every key in one slot
+            if isinstance(db, (RedisCluster, AsyncRedisCluster)):
+                self.basekey = f"{{{basekey}}}"
+            else:
+                self.basekey = basekey
 
-class Redis(DefaultRedis):
-    """Turns 'True' and 'False' values returns
-    in redis to bool values"""
+        # Passing a cache makes this namespace and everything below it cached.
+        # It is registered on the root so any other SubRedis built for the
+        # same namespace shares it and sees its invalidations
+        caches: Dict[str, RedisCache] = getattr(self.root, "caches", dict())
 
-    # Bool transforms will be performed on these redis commands
-    command_list = ['HGET', 'HGETALL', 'GET', 'LRANGE']
+        if cache is not None:
+            caches[self.basekey] = cache
 
-    def parse_response(self, connection, command_name, **options):
-        ret = super().parse_response(connection, command_name, **options)
-        # ret = eval(compile(ret, '<string>', 'eval'))
-        if command_name in self.command_list:
-            return bool_transform(ret)
-        else:
-            return ret
+        self.cache: Optional[RedisCache] = cache or next(
+            (c for ns, c in caches.items() if self.basekey == ns or self.basekey.startswith(f"{ns}:")),
+            None
+        )
 
-    def to_dict(self, match: str = "*", cast_values: bool = False, include_types: bool = False) -> Dict[str: Any]:
+    """ #########
+         Caching
+        ######### """
 
-        data_types = {
-            "string": (self.get, tuple(), None),
-            "list": (self.lrange, (0, -1), None),
-            "set": (self.smembers, tuple(), list),
-            "zset": (self.zrange, (0, -1, False, True), dict),
-            "hash": (self.hgetall, tuple(), None)
-        }
+    def _read(self, name: str, command: str, callback: Callable, *args) -> Any:
+        """Run a read, serving it from the local cache if there is one"""
 
-        mapping = dict()
+        key = f"{self.basekey}:{name}"
 
-        if include_types:
-            mapping["::types"] = dict()
+        if self.cache is None:
+            return callback(key, *args)
 
-        for key in self.scan_iter(match=match):
-            data_type = self.type(key)
+        entry = (key, command, *args)
+        found, value = self.cache.get(entry)
 
-            if include_types:
-                mapping["::types"][key] = data_type
+        if not found:
+            generation = self.cache.generation(key)
+            value = callback(key, *args)
 
-            callback, args, cast_type = data_types.get(data_type)
+            if not self._degraded():
+                self.cache.put(entry, value, generation)
 
-            value = callback(key, *args)
+        return value
 
-            cursor = mapping
+    def _degraded(self) -> bool:
+        """Whether replies may be from the breaker's snapshot, which must not outlive the outage in the cache"""
+        breaker = getattr(self.root, "breaker", None)
+        return breaker is not None and (breaker.failures > 0 or breaker.opened_at is not None)
 
-            for ns in key.split(":"):
-                if ns not in cursor.keys():
-                    cursor[ns] = dict()
-                cursor = cursor[ns]
+    def _write(self, names: Tuple[str, ...], callback: Callable, *args) -> Any:
+        """Run a write, invalidating cached entries for ``names``"""
 
-            if cast_values and cast_type:
-                value = cast_type(value)
+        keys = [f"{self.basekey}:{name}" for name in names]
+        ret = callback(*keys, *args)
+        self._written(keys)
 
-            cursor[key] = value
+        return ret
 
-        return mapping
+    def _written(self, keys: List[str]) -> None:
+        """Drop cached entries for ``keys`` and read them from the primary for a while"""
 
-    # def update(self, root_key: str, mapping: Dict[str: Union[str, list, set, dict, Tuple[str, int]]]):
-    #
-    #     for key, value in mapping.items():
-    #         self.zadd()
+        if self.cache is not None:
+            self.cache.invalidate(*keys)
 
+        if self.reader is not self.root:
+            self.reader.pin(*keys)
 
-class SubRedis:
+    """ ##########
+         Batching
+        ########## """
+
+    @contextmanager
+    def batch(self, transaction: bool = False) -> Generator[SubRedisBatch, None, None]:
+        """
+        Queue namespaced commands into a single pipeline
 
-    def __init__(self, db: Union[Redis, SubRedis], basekey: str):
+        ``with sub.batch() as b:`` yields a SubRedisBatch. Commands called
+        on it are sent together in one round trip when the block exits,
+        and their decoded replies are stored in ``b.results`` in order.
 
-        if isinstance(db, SubRedis):
-            self.root = db.root
-            self.basekey = f"{db.basekey}:{basekey}"
+        ``transaction`` wraps the commands in MULTI/EXEC
+        """
+        with self.root.pipeline(transaction=transaction) as pipe:
+            b = SubRedisBatch(pipe, self)
+            yield b
+            b.results = pipe.execute()
 
-        else:
-            self.root = db
-            self.basekey = basekey
+        self._written(b.written)
 
     """ ###############
          Managing Keys
@@ -506,12 +2751,11 @@ class SubRedis:
     def exists(self, *names: str) -> int:
         """Returns the number of ``names`` that exist"""
         names = [f"{self.basekey}:{name}" for name in names]
-        return self.root.exists(*names)
+        return self.reader.exists(*names)
 
     def delete(self, *names: str) -> Any:
         """Delete one or more keys specified by ``names``"""
-        names = [f"{self.basekey}:{name}" for name in names]
-        return self.root.delete(*names)
+        return self._write(names, self.root.delete)
 
     """ ###########
          Iterators
@@ -528,7 +2772,7 @@ class SubRedis:
         """
         if not match == "*":
             match = f":{match}"
-        for item in self.root.scan_iter(match=f"{self.basekey}{match}", count=count, _type=_type):
+        for item in self.reader.scan_iter(match=f"{self.basekey}{match}", count=count, _type=_type):
             yield item.replace(f"{self.basekey}:", "")
 
     """ ###############
@@ -549,11 +2793,11 @@ class SubRedis:
         ``xx`` if set to True, set the value at key ``name`` to ``value`` only
             if it already exists.
         """
-        return self.root.set(f"{self.basekey}:{name}", value, ex, px, nx, xx)
+        return self._write((name,), self.root.set, value, ex, px, nx, xx)
 
     def get(self, name: str) -> str:
         """Return the value at key ``name``, or None if the key doesn't exist"""
-        return self.root.get(f"{self.basekey}:{name}")
+        return self._read(name, "GET", self.reader.get)
 
     """ ######
          Sets
@@ -561,23 +2805,23 @@ class SubRedis:
 
     def scard(self, name: str) -> int:
         """Return the number of elements in set ``name``"""
-        return self.root.scard(f"{self.basekey}:{name}")
+        return self._read(name, "SCARD", self.reader.scard)
 
     def sismember(self, name: str, value: str) -> bool:
         """Return a boolean indicating if ``value`` is a member of set ``name``"""
-        return self.root.sismember(f"{self.basekey}:{name}", value)
+        return self._read(name, "SISMEMBER", self.reader.sismember, value)
 
     def smembers(self, names: str) -> Set[str]:
         """Return all members of the set ``name``"""
-        return self.root.smembers(f"{self.basekey}:{names}")
+        return self._read(names, "SMEMBERS", self.reader.smembers)
 
     def sadd(self, name: str, *values: str) -> Any:
         """Add ``value(s)`` to set ``name``"""
-        return self.root.sadd(f"{self.basekey}:{name}", *values)
+        return self._write((name,), self.root.sadd, *values)
 
     def srem(self, name: str, *values: str) -> Any:
         """Remove ``values`` from set ``name``"""
-        return self.root.srem(f"{self.basekey}:{name}", *values)
+        return self._write((name,), self.root.srem, *values)
 
     """ #######
          Lists
@@ -591,11 +2835,11 @@ class SubRedis:
         ``start`` and ``end`` can be negative numbers just like
         Python slicing notation
         """
-        return self.root.lrange(f"{self.basekey}:{name}", start, end)
+        return self._read(name, "LRANGE", self.reader.lrange, start, end)
 
     def lpush(self, name: str, *values: str) -> Any:
         """Push ``values`` onto the head of the list ``name``"""
-        return self.root.lpush(f"{self.basekey}:{name}", *values)
+        return self._write((name,), self.root.lpush, *values)
 
     def lrem(self, name: str, count: int, value: str) -> Any:
         """
@@ -607,7 +2851,7 @@ class SubRedis:
             count < 0: Remove elements equal to value moving from tail to head.
             count = 0: Remove all elements equal to value.
         """
-        return self.root.lrem(f"{self.basekey}:{name}", count, value)
+        return self._write((name,), self.root.lrem, count, value)
 
     """ #############################
          Hashes (Dict-like Mappings)
@@ -615,106 +2859,433 @@ class SubRedis:
 
     def hget(self, name: str, key: str) -> str:
         """Return the value of ``key`` within the hash ``name``"""
-        return self.root.hget(f"{self.basekey}:{name}", key)
+        return self._read(name, "HGET", self.reader.hget, key)
 
     def hkeys(self, name: str) -> List[str]:
         """Return the list of keys within hash ``name``"""
-        return self.root.hkeys(f"{self.basekey}:{name}")
+        return self._read(name, "HKEYS", self.reader.hkeys)
 
     def hvals(self, name: str) -> List[str]:
         """Return the list of values within hash ``name``"""
-        return self.root.hvals(f"{self.basekey}:{name}")
+        return self._read(name, "HVALS", self.reader.hvals)
 
     def hgetall(self, name: str) -> Dict[str, Any]:
         """Return a Python dict of the hash's name/value pairs"""
-        return self.root.hgetall(f"{self.basekey}:{name}")
+        return self._read(name, "HGETALL", self.reader.hgetall)
 
-    def hset(self, name: str, key: str, value: str) -> Any:
+    def hset(self, name: str, key: str = None, value: str = None, mapping: dict = None) -> Any:
         """
         Set ``key`` to ``value`` within hash ``name``
-        Returns 1 if HSET created a new field, otherwise 0
+        ``mapping`` accepts a dict of key/value pairs that will be
+        added to hash ``name``.
+        Returns the number of fields that were added.
         """
-        return self.root.hset(f"{self.basekey}:{name}", key, value)
+        return self._write((name,), self.root.hset, key, value, mapping)
+
+    def hsetnx(self, name: str, key: str, value: str) -> Any:
+        """
+        Set ``key`` to ``value`` within hash ``name`` if ``key`` does not exist
+        Returns 1 if HSETNX created a field, otherwise 0
+        """
+        return self._write((name,), self.root.hsetnx, key, value)
 
     def hmset(self, name: str, mapping: dict) -> Any:
         """
         Set key to value within hash ``name`` for each corresponding
         key and value from the ``mapping`` dict.
         """
-        return self.root.hmset(f"{self.basekey}:{name}", mapping)
+        return self._write((name,), self.root.hmset, mapping)
 
     def hdel(self, name: str, *keys):
         """Delete ``keys`` from hash ``name``"""
-        return self.root.hdel(name, *keys)
+        return self._write((name,), self.root.hdel, *keys)
 
+    """ #############
+         Sorted Sets
+        ############# """
 
-class Paginator:
+    def zincrby(self, name: str, amount: float, value: str) -> Any:
+        """Increment the score of ``value`` in sorted set ``name`` by ``amount``"""
+        return self._write((name,), self.root.zincrby, amount, value)
 
-    def __init__(
-            self,
-            page_limit: int = 1000,
-            trunc_limit: int = 2000,
-    ):
-        self.page_limit = page_limit
-        self.trunc_limit = trunc_limit
-        self._pages = None
+    def zrevrange(self, name: str, start: int, end: int, withscores: bool = False) -> List[Any]:
+        """
+        Return a slice of the sorted set ``name`` between position
+        ``start`` and ``end``, highest score first
 
-    @property
-    def pages(self):
-        return self._pages
+        ``withscores`` returns (value, score) pairs
+        """
+        return self._read(name, "ZREVRANGE", self.reader.zrevrange, start, end, withscores)
 
-    def set_trunc_limit(self, limit: int = 2000):
-        self.trunc_limit = limit
+    def zscore(self, name: str, value: str) -> Optional[float]:
+        """Return the score of ``value`` in sorted set ``name``"""
+        return self._read(name, "ZSCORE", self.reader.zscore, value)
 
-    def set_page_limit(self, limit: int = 1000):
-        self.page_limit = limit
+    """ #########
+         Scripts
+        ######### """
 
-    def paginate(self, value: str) -> List[str]:
+    def run_script(self, script: RedisScript, names: Tuple[str, ...], *args) -> Any:
         """
-        To paginate a string into a list of strings under
-        `self.page_limit` characters. Total len of strings
-        will not exceed `self.trunc_limit`.
-        :param value: string to paginate
-        :return list: list of strings under 'page_limit' chars
+        Run ``script`` atomically with namespaced ``names`` as KEYS
+        and ``args`` as ARGV
+
+        Cached entries for ``names`` are invalidated afterwards
         """
-        spl = str(value).split('\n')
-        ret = list()
-        page = ''
-        total = 0
+        return self._write(names, partial(script.run, self.root, len(names)), *args)
 
-        for i in spl:
-            if total + len(page) >= self.trunc_limit:
-                ret.append(page[:self.trunc_limit - total])
-                break
 
-            if (len(page) + len(i)) < self.page_limit:
-                page += f'\n{i}'
-                continue
+class AsyncSubRedis(SubRedis):
+    """SubRedis for an AsyncRedis root
 
-            else:
-                if page:
-                    total += len(page)
-                    ret.append(page)
-
-                if len(i) > (self.page_limit - 1):
-                    tmp = i
-                    while len(tmp) > (self.page_limit - 1):
-                        if total + len(tmp) < self.trunc_limit:
-                            total += len(tmp[:self.page_limit])
-                            ret.append(tmp[:self.page_limit])
-                            tmp = tmp[self.page_limit:]
-                        else:
-                            ret.append(tmp[:self.trunc_limit - total])
-                            break
-                    else:
-                        page = tmp
-                else:
-                    page = i
+    Every command is passed through to the root client, so each method
+    returns an awaitable instead of the reply itself. Only the iterators
+    and the caching hooks need their own implementations."""
+
+    def __init__(self, db: Union[AsyncRedis, AsyncSubRedis], basekey: str, cache: RedisCache = None,
+                 reader: AsyncReplicaReader = None):
+        super().__init__(db, basekey, cache, reader)
+
+        # Reads in flight, shared by every AsyncSubRedis below the same top-level one
+        self.flights: Dict[Tuple, Future] = db.flights if isinstance(db, AsyncSubRedis) else dict()
+
+    """ #########
+         Caching
+        ######### """
+
+    async def _read(self, name: str, command: str, callback: Callable, *args) -> Any:
+        """Run a read, serving it from the local cache if there is one
+
+        Identical reads made while one is already in flight wait
+        for its reply instead of sending their own command"""
+
+        key = f"{self.basekey}:{name}"
+        entry = (key, command, *args)
+
+        if self.cache is not None:
+            found, value = self.cache.get(entry)
+            if found:
+                return value
+
+        flight = self.flights.get(entry)
+
+        if flight is not None:
+            self.root.stats.coalesced += 1
+            return copy(await shield(flight))
+
+        generation = self.cache.generation(key) if self.cache is not None else None
+
+        # Run as its own task so cancelling the first caller does not fail the others
+        flight = self.flights[entry] = ensure_future(callback(key, *args))
+        flight.add_done_callback(partial(self._landed, entry))
+
+        value = await shield(flight)
+
+        if self.cache is not None and not self._degraded():
+            self.cache.put(entry, value, generation)
+
+        return value
+
+    def _landed(self, entry: Tuple, flight: Future) -> None:
+        if self.flights.get(entry) is flight:
+            del self.flights[entry]
+
+    def _written(self, keys: List[str]) -> None:
+        """Drop cached entries and reads in flight for ``keys``, and read them from the primary for a while
+
+        Reads made after a write must not be answered by one sent before it"""
+
+        super()._written(keys)
+
+        if self.flights:
+            for entry in [entry for entry in self.flights if entry[0] in keys]:
+                del self.flights[entry]
+
+    async def _write(self, names: Tuple[str, ...], callback: Callable, *args) -> Any:
+        """Run a write, invalidating cached entries for ``names``"""
+
+        keys = [f"{self.basekey}:{name}" for name in names]
+        ret = await callback(*keys, *args)
+        self._written(keys)
+
+        return ret
+
+    """ ##########
+         Batching
+        ########## """
+
+    @asynccontextmanager
+    async def batch(self, transaction: bool = False) -> AsyncIterator[SubRedisBatch]:
+        """
+        Queue namespaced commands into a single pipeline
+
+        ``async with sub.batch() as b:`` yields a SubRedisBatch. Commands
+        called on it are sent together in one round trip when the block
+        exits, and their decoded replies are stored in ``b.results``.
+
+        ``transaction`` wraps the commands in MULTI/EXEC
+        """
+        async with self.root.pipeline(transaction=transaction) as pipe:
+            b = SubRedisBatch(pipe, self)
+            yield b
+            b.results = await pipe.execute()
+
+        self._written(b.written)
+
+    """ #########
+         Scripts
+        ######### """
+
+    def run_script(self, script: RedisScript, names: Tuple[str, ...], *args) -> Any:
+        """
+        Run ``script`` atomically with namespaced ``names`` as KEYS
+        and ``args`` as ARGV
+
+        Cached entries for ``names`` are invalidated afterwards
+        """
+        return self._write(names, partial(script.run_async, self.root, len(names)), *args)
+
+    """ ###########
+         Iterators
+        ########### """
+
+    async def scan_iter(self, match: str = None, count: int = None, _type: str = None) -> AsyncGenerator[str, None]:
+        """
+        Make an async iterator using the SCAN command so that the client
+        doesn't need to remember the cursor position.
+
+        ``pattern`` allows for filtering the keys by pattern
+
+        ``count`` allows for hint the minimum number of returns
+        """
+        if not match == "*":
+            match = f":{match}"
+        async for item in self.reader.scan_iter(match=f"{self.basekey}{match}", count=count, _type=_type):
+            yield item.replace(f"{self.basekey}:", "")
+
+
+class SubRedisBatch(SubRedis):
+    """SubRedis bound to a pipeline, yielded by `SubRedis.batch`
+
+    Commands are queued instead of sent, so their return values are
+    the pipeline itself. Replies are in `results` once the batch exits."""
+
+    def __init__(self, pipe: Union[Pipeline, AsyncPipeline], sub: SubRedis):
+        super().__init__(pipe, sub.basekey)
+
+        # Keys written during the batch, invalidated in the parent's cache on exit
+        self.written: List[str] = list()
+
+        self.results: List[Any] = list()
+
+    def _read(self, name: str, command: str, callback: Callable, *args) -> Any:
+        return callback(f"{self.basekey}:{name}", *args)
+
+    def _write(self, names: Tuple[str, ...], callback: Callable, *args) -> Any:
+        keys = [f"{self.basekey}:{name}" for name in names]
+        self.written.extend(keys)
+        return callback(*keys, *args)
+
+
+def _set_mention(client: Redis, keys: List[str], args: List[str]) -> str:
+    """SET_MENTION for backends without Lua"""
+    enabled = args[0] or ("False" if client.hget(keys[0], "when_mentioned") == "True" else "True")
+    client.hset(keys[0], "when_mentioned", enabled)
+    return enabled
+
+
+def _set_guild(client: Redis, keys: List[str], args: List[str]) -> Optional[str]:
+    """SET_GUILD for backends without Lua"""
+    previous = client.hget(keys[0], args[0])
+    if args[1]:
+        client.hset(keys[0], args[0], args[1])
+    else:
+        client.hdel(keys[0], args[0])
+    return previous
+
+
+class PrefixResolver:
+    """In-memory copy of the `prefix:config` and `prefix:guild` hashes
+
+    Passed to Bot as `command_prefix`. Resolving a prefix never touches
+    Redis. The copy is loaded once at startup and kept current by the
+    setters, which write through to Redis before updating memory. While
+    Redis is unreachable the setters raise CircuitOpenError and change
+    nothing."""
+
+    # Toggles when_mentioned if ARGV[1] is empty, otherwise sets it. Returns the new value
+    SET_MENTION = RedisScript(
+        """
+        local enabled = ARGV[1]
+        if enabled == "" then
+            enabled = redis.call("HGET", KEYS[1], "when_mentioned") == "True" and "False" or "True"
+        end
+        redis.call("HSET", KEYS[1], "when_mentioned", enabled)
+        return enabled
+        """,
+        _set_mention
+    )
+
+    # Sets guild ARGV[1]'s prefix to ARGV[2], or unsets it if empty. Returns the previous prefix
+    SET_GUILD = RedisScript(
+        """
+        local previous = redis.call("HGET", KEYS[1], ARGV[1])
+        if ARGV[2] == "" then
+            redis.call("HDEL", KEYS[1], ARGV[1])
+        else
+            redis.call("HSET", KEYS[1], ARGV[1], ARGV[2])
+        end
+        return previous
+        """,
+        _set_guild
+    )
+
+    def __init__(self, config: AsyncSubRedis):
+        self.config = config
+
+        self.default_prefix: str = "!"
+        self.when_mentioned: bool = False
+
+        # Guild ID to guild-specific prefix
+        self.guilds: Dict[int, str] = dict()
+
+    def load(self, prefix_config: Dict[str, Any], guild_prefixes: Dict[str, str]) -> None:
+        """Replace the in-memory copy with the given hash contents"""
+        self.default_prefix = prefix_config.get("default_prefix", "!")
+        self.when_mentioned = prefix_config.get("when_mentioned", False) is True
+        self.guilds = {int(guild_id): str(prefix) for guild_id, prefix in guild_prefixes.items()}
+
+    async def reload(self) -> None:
+        """Reload the in-memory copy from Redis"""
+        self.load(
+            await self.config.hgetall("prefix:config"),
+            await self.config.hgetall("prefix:guild")
+        )
+
+    def __call__(self, bot: Bot, msg: Message) -> List[str]:
+        """Determine guild-specific prefix or default"""
+
+        prefix = [self.default_prefix]
+        if self.when_mentioned:
+            prefix.extend(when_mentioned(bot, msg))
+
+        # If in a guild, check for guild-specific prefix
+        if isinstance(msg.channel, TextChannel):
+            guild_prefix = self.guilds.get(msg.channel.guild.id)
+            if guild_prefix:
+                prefix.append(guild_prefix)
+
+        return prefix
+
+    def could_match(self, msg: Message) -> bool:
+        """Cheap test for whether ``msg`` starts with any known prefix
+
+        Messages that fail this cannot be commands and can be dropped
+        before discord.py builds a Context for them"""
+
+        content = msg.content
+
+        if content.startswith(self.default_prefix):
+            return True
+
+        if self.when_mentioned and content.startswith("<@"):
+            return True
+
+        if isinstance(msg.channel, TextChannel):
+            guild_prefix = self.guilds.get(msg.channel.guild.id)
+            if guild_prefix and content.startswith(guild_prefix):
+                return True
+
+        return False
+
+    """ #########
+         Setters
+        ######### """
+
+    async def set_default(self, prefix: str) -> None:
+        """Change the default prefix"""
+        with CircuitBreaker.unqueued():
+            await self.config.hset("prefix:config", "default_prefix", prefix)
+        self.default_prefix = prefix
+
+    async def set_mention(self, enabled: bool = None) -> bool:
+        """Change whether bot mentions count as a prefix, toggling it if ``enabled`` is None
+
+        Returns the new setting"""
+        arg = "" if enabled is None else str(enabled)
+        with CircuitBreaker.unqueued():
+            self.when_mentioned = await self.config.run_script(self.SET_MENTION, ("prefix:config",), arg) == "True"
+        return self.when_mentioned
+
+    async def set_guild(self, guild_id: int, prefix: str = None) -> Optional[str]:
+        """Set the prefix for a guild, or unset it if ``prefix`` is None
+
+        Returns the previous prefix"""
+        with CircuitBreaker.unqueued():
+            previous = await self.config.run_script(self.SET_GUILD, ("prefix:guild",), f"{guild_id}", prefix or "")
+
+        if prefix:
+            self.guilds[int(guild_id)] = prefix
         else:
-            ret.append(page)
+            self.guilds.pop(int(guild_id), None)
 
-        self._pages = ret
-        return self.pages
+        return previous
+
+
+class PermissionIndex:
+    """In-memory copy of the `permissions:sudoers` set, as user IDs
+
+    Used by the checks in utils.checks, so a check is a set lookup and
+    never touches Redis. Loaded once at startup, kept current by the
+    setters, and reloaded every ``ttl`` seconds to pick up changes made
+    by other processes. While Redis is unreachable the setters raise
+    CircuitOpenError and change nothing."""
+
+    def __init__(self, config: AsyncSubRedis, ttl: float = 300.0):
+        self.config = config
+        self.ttl = ttl
+
+        self.sudoers: Set[int] = set()
+
+        self._loaded: float = monotonic()
+
+    def load(self, sudoers: Iterable[str]) -> None:
+        """Replace the in-memory copy with the given set members"""
+        self.sudoers = {int(user_id) for user_id in sudoers if str(user_id).isdigit()}
+        self._loaded = monotonic()
+
+    async def reload(self) -> None:
+        """Reload the in-memory copy from Redis"""
+        self.load(await self.config.smembers("permissions:sudoers"))
+
+    async def fresh(self) -> None:
+        """Reload if the copy is older than ``ttl``. Free otherwise"""
+
+        if monotonic() - self._loaded >= self.ttl:
+            # Marked first so concurrent checks don't all reload
+            self._loaded = monotonic()
+            await self.reload()
+
+    def is_sudoer(self, user_id: int) -> bool:
+        return user_id in self.sudoers
+
+    """ #########
+         Setters
+        ######### """
+
+    async def add_sudoer(self, user_id: int) -> bool:
+        """Grant sudo to a user. Returns whether they were not already a sudoer"""
+        with CircuitBreaker.unqueued():
+            added = await self.config.sadd("permissions:sudoers", str(user_id))
+        self.sudoers.add(int(user_id))
+        return bool(added)
+
+    async def remove_sudoer(self, user_id: int) -> bool:
+        """Revoke sudo from a user. Returns whether they were a sudoer"""
+        with CircuitBreaker.unqueued():
+            removed = await self.config.srem("permissions:sudoers", str(user_id))
+        self.sudoers.discard(int(user_id))
+        return bool(removed)
 
 
 class GlobalTextChannelConverter(IDConverter):
@@ -5,9 +5,16 @@
 
 
 from discord.ext.commands.errors import CommandError
+from redis.exceptions import ConnectionError as RedisConnectionError
 
 
 class UnimplementedError(CommandError):
     """Exception raised when a command is called
     using a feature that has not yet been
     implemented"""
+
+
+class CircuitOpenError(RedisConnectionError):
+    """Exception raised when Redis is unreachable
+    and a read has no snapshot value to fall
+    back on"""
@@ -0,0 +1,825 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+
+"""Embedded in-process storage backend
+
+Implements the part of the Redis command set used by SubRedis, the cogs
+and utils.backup on plain Python containers, so a single-node bot or a
+benchmark can run without a Redis server. The redis-py command mixins
+are reused, so method signatures are exactly those of Redis.
+
+Writes are appended to a local file as JSON lines, flushed by a timer
+thread at most ``fsync_interval`` seconds after they are made, so fsync
+never blocks the event loop. The file is replayed on startup and is
+rewritten as a compact snapshot once it grows well past the live data.
+
+Not thread-safe. Both facades are meant to be used from one thread,
+only the flush timer runs on another.
+"""
+
+
+# Lib
+import atexit
+from fnmatch import fnmatchcase
+from hashlib import sha1
+from json import dumps, loads
+from os import fsync, replace
+from os.path import exists
+from threading import Lock, Timer
+from time import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Site
+from redis.commands.core import AsyncDataAccessCommands, AsyncScriptCommands, DataAccessCommands, ScriptCommands
+from redis.exceptions import NoScriptError, ResponseError
+
+# Local
+from utils.classes import AsyncRedis, AsyncRedisClient, Redis, RedisClient, RedisSchema, RedisScript
+
+
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+
+class ZSet(dict):
+    """Sorted set, member -> score"""
+
+
+def _str(value: Any) -> str:
+    """Encode a value the way redis-py would before sending it"""
+
+    if isinstance(value, bytes):
+        return value.decode("utf8")
+
+    elif isinstance(value, float):
+        return repr(value)
+
+    return str(value)
+
+
+class MemoryStore:
+    """Keyspace and append-only file shared by MemoryRedis and AsyncMemoryRedis"""
+
+    # Container -> name reported by TYPE
+    TYPES = {
+        str: "string",
+        list: "list",
+        set: "set",
+        dict: "hash",
+        ZSet: "zset"
+    }
+
+    def __init__(self, path: str = None, fsync_interval: float = 1.0, rewrite_min: int = 10000):
+        self.path = path
+        self.fsync_interval = fsync_interval
+
+        # Rewrite the file once it has this many lines and twice the live keys
+        self.rewrite_min = rewrite_min
+
+        self.data: Dict[str, Any] = dict()
+
+        # key -> absolute expiry in epoch milliseconds
+        self.expires: Dict[str, int] = dict()
+
+        # Writes not flushed yet, and a snapshot from `rewrite` to replace the file with first
+        self._buffer: List[str] = list()
+        self._rewritten: Optional[List[str]] = None
+        self._lines: int = 0
+        self._replaying: bool = False
+
+        # Pending flush, started by the first write after the last one
+        self._timer: Optional[Timer] = None
+
+        # Guards the above against the timer's thread
+        self._lock = Lock()
+
+        # Held for a whole flush, so flushes reach the file in order
+        self._flushing = Lock()
+
+        self._commands: Dict[str, Callable] = {
+            "PING": lambda: True,
+            "DBSIZE": lambda: len(self._live_keys()),
+            "FLUSHDB": self._flushdb,
+            "EXISTS": self._exists,
+            "DEL": self._delete,
+            "TYPE": self._type,
+            "KEYS": self._keys,
+            "SCAN": self._scan,
+            "PTTL": self._pttl,
+            "TTL": lambda name: self._ttl(name),
+            "PEXPIREAT": self._pexpireat,
+            "PEXPIRE": lambda name, ms: self._pexpireat(name, int(time() * 1000) + int(ms)),
+            "EXPIRE": lambda name, s: self._pexpireat(name, int(time() * 1000) + int(s) * 1000),
+            "EXPIREAT": lambda name, ts: self._pexpireat(name, int(ts) * 1000),
+            "PERSIST": self._persist,
+            "GET": self._get,
+            "SET": self._set,
+            "INCRBY": self._incrby,
+            "INCR": lambda name: self._incrby(name, 1),
+            "SADD": self._sadd,
+            "SREM": self._srem,
+            "SMEMBERS": lambda name: set(self._read(name, set, set())),
+            "SISMEMBER": lambda name, value: _str(value) in self._read(name, set, set()),
+            "SCARD": lambda name: len(self._read(name, set, set())),
+            "LPUSH": self._lpush,
+            "RPUSH": self._rpush,
+            "LRANGE": self._lrange,
+            "LREM": self._lrem,
+            "LINDEX": self._lindex,
+            "LLEN": lambda name: len(self._read(name, list, list())),
+            "HGET": lambda name, key: self._read(name, dict, dict()).get(_str(key)),
+            "HMGET": lambda name, *keys: [self._read(name, dict, dict()).get(_str(key)) for key in keys],
+            "HGETALL": lambda name: dict(self._read(name, dict, dict())),
+            "HKEYS": lambda name: list(self._read(name, dict, dict()).keys()),
+            "HVALS": lambda name: list(self._read(name, dict, dict()).values()),
+            "HLEN": lambda name: len(self._read(name, dict, dict())),
+            "HEXISTS": lambda name, key: _str(key) in self._read(name, dict, dict()),
+            "HSET": self._hset,
+            "HMSET": self._hmset,
+            "HSETNX": self._hsetnx,
+            "HDEL": self._hdel,
+            "HINCRBY": self._hincrby,
+            "ZADD": self._zadd,
+            "ZINCRBY": lambda name, amount, member: self._zadd(name, "INCR", amount, member),
+            "ZRANGE": self._zrange,
+            "ZREVRANGE": lambda name, start, end, *args, **options: self._zrange(name, start, end, "REV", *args, **options),
+            "ZSCORE": lambda name, member: self._read(name, ZSet, ZSet()).get(_str(member)),
+            "ZREM": self._zrem,
+            "ZCARD": lambda name: len(self._read(name, ZSet, ZSet())),
+            "EVALSHA": self._evalsha,
+            "SCRIPT LOAD": lambda script: sha1(_str(script).encode("utf8")).hexdigest(),
+            "SCRIPT EXISTS": lambda *shas: [_str(sha) in RedisScript.registry for sha in shas],
+        }
+
+        if path and exists(path):
+            self.replay()
+
+        if path:
+            atexit.register(self.flush)
+
+    """ ###########
+         Execution
+        ########### """
+
+    def execute(self, args: Tuple, options: Dict[str, Any]) -> Any:
+        """Run one command, returning the reply redis-py would return"""
+
+        command = str(args[0]).upper()
+        handler = self._commands.get(command)
+
+        if handler is None:
+            raise ResponseError(f"unknown command '{command}'")
+
+        if command in ("ZRANGE", "ZREVRANGE"):
+            return handler(*args[1:], **options)
+
+        return handler(*args[1:])
+
+    """ ################
+         Append-only file
+        ################ """
+
+    def _log(self, *args: Any) -> None:
+        """Buffer a write, to be flushed within ``fsync_interval``"""
+
+        if self._replaying or not self.path:
+            return
+
+        line = dumps([_str(arg) for arg in args], separators=(",", ":"))
+
+        with self._lock:
+            self._buffer.append(line)
+
+        if self._rewritten is None and self._lines >= self.rewrite_min and self._lines >= 2 * len(self.data):
+            self.rewrite()
+        else:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        """Start the flush timer, unless a flush is already pending"""
+
+        with self._lock:
+            if self._timer is not None:
+                return
+
+            timer = self._timer = Timer(self.fsync_interval, self.flush)
+            timer.daemon = True
+
+        timer.start()
+
+    def flush(self) -> None:
+        """Write and fsync buffered writes
+
+        Blocks. Called by the timer, off the event loop, and at exit"""
+
+        if not self.path:
+            return
+
+        with self._flushing:
+            with self._lock:
+                lines, self._buffer = self._buffer, list()
+                rewritten, self._rewritten = self._rewritten, None
+                timer, self._timer = self._timer, None
+
+            # Flushed early, the pending timer has nothing left to do
+            if timer is not None:
+                timer.cancel()
+
+            if rewritten is not None:
+                tmp = f"{self.path}.tmp"
+
+                with open(tmp, "w", encoding="utf8") as fp:
+                    fp.writelines(f"{line}\n" for line in rewritten + lines)
+                    fp.flush()
+                    fsync(fp.fileno())
+
+                replace(tmp, self.path)
+
+            elif lines:
+                with open(self.path, "a", encoding="utf8") as fp:
+                    fp.writelines(f"{line}\n" for line in lines)
+                    fp.flush()
+                    fsync(fp.fileno())
+
+            with self._lock:
+                self._lines += len(lines)
+
+    def replay(self) -> None:
+        """Rebuild the keyspace from the file"""
+
+        self._replaying = True
+        self._lines = 0
+
+        # Bytes up to the end of the last whole line
+        size = 0
+
+        try:
+            with open(self.path, "r", encoding="utf8", newline="\n") as fp:
+                for line in fp:
+                    if not line.endswith("\n"):
+                        break
+
+                    size += len(line.encode("utf8"))
+
+                    try:
+                        args = loads(line)
+                    except ValueError:
+                        continue
+
+                    self.execute(args, dict())
+                    self._lines += 1
+
+        finally:
+            self._replaying = False
+
+        # Torn final line from a crash mid-write. Cut, so the next write starts a line of its own
+        with open(self.path, "r+b") as fp:
+            fp.truncate(size)
+
+    def rewrite(self) -> None:
+        """Replace the file with the smallest set of writes that recreates the live data
+
+        The writes are taken now, and replace the file at the next flush"""
+
+        lines = [
+            dumps([_str(arg) for arg in args], separators=(",", ":"))
+            for key in self._live_keys() for args in self._snapshot(key)
+        ]
+
+        with self._lock:
+            # Already part of the snapshot
+            self._buffer.clear()
+            self._rewritten = lines
+            self._lines = len(lines)
+
+        self._schedule()
+
+    def _snapshot(self, key: str) -> Iterable[Tuple]:
+        value = self.data[key]
+
+        if isinstance(value, str):
+            yield "SET", key, value
+        elif isinstance(value, list):
+            yield ("RPUSH", key, *value)
+        elif isinstance(value, set):
+            yield ("SADD", key, *value)
+        elif isinstance(value, ZSet):
+            yield ("ZADD", key, *[i for member, score in value.items() for i in (score, member)])
+        elif isinstance(value, dict):
+            yield ("HSET", key, *[i for item in value.items() for i in item])
+
+        if key in self.expires:
+            yield "PEXPIREAT", key, self.expires[key]
+
+    """ ########
+         Access
+        ######## """
+
+    def _alive(self, key: str) -> bool:
+        """Whether ``key`` exists, evicting it if it has expired"""
+
+        expiry = self.expires.get(key)
+        if expiry is not None and expiry <= time() * 1000:
+            self.data.pop(key, None)
+            del self.expires[key]
+            return False
+
+        return key in self.data
+
+    def _live_keys(self) -> List[str]:
+        return [key for key in list(self.data) if self._alive(key)]
+
+    def _read(self, name: str, data_type: type, default: Any) -> Any:
+        """The value at ``name``, or ``default`` if missing"""
+
+        name = _str(name)
+
+        if not self._alive(name):
+            return default
+
+        value = self.data[name]
+        if type(value) is not data_type:
+            raise ResponseError(WRONGTYPE)
+
+        return value
+
+    def _write(self, name: str, data_type: type) -> Any:
+        """The value at ``name`` for modifying, created if missing"""
+
+        name = _str(name)
+
+        if not self._alive(name):
+            self.data[name] = data_type()
+
+        value = self.data[name]
+        if type(value) is not data_type:
+            raise ResponseError(WRONGTYPE)
+
+        return value
+
+    def _cleanup(self, name: str) -> None:
+        """Remove ``name`` if it was left empty, as Redis does"""
+        if not self.data.get(name) and not isinstance(self.data.get(name), str):
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+
+    """ ######
+         Keys
+        ###### """
+
+    def _flushdb(self) -> bool:
+        self.data.clear()
+        self.expires.clear()
+        self._log("FLUSHDB")
+        return True
+
+    def _exists(self, *names: str) -> int:
+        return sum(1 for name in names if self._alive(_str(name)))
+
+    def _delete(self, *names: str) -> int:
+        deleted = 0
+        for name in map(_str, names):
+            if self._alive(name):
+                del self.data[name]
+                self.expires.pop(name, None)
+                deleted += 1
+
+        if deleted:
+            self._log("DEL", *names)
+
+        return deleted
+
+    def _type(self, name: str) -> str:
+        name = _str(name)
+        if not self._alive(name):
+            return "none"
+        return self.TYPES[type(self.data[name])]
+
+    def _keys(self, pattern: str = "*") -> List[str]:
+        return [key for key in self._live_keys() if fnmatchcase(key, _str(pattern))]
+
+    def _scan(self, cursor: Any = 0, *args: Any) -> Tuple[int, List[str]]:
+        """Every match is returned in one batch, there is no server to keep responsive"""
+
+        options = dict(zip([_str(a).upper() for a in args[::2]], map(_str, args[1::2])))
+        keys = self._keys(options.get("MATCH", "*"))
+
+        if "TYPE" in options:
+            keys = [key for key in keys if self._type(key) == str(options["TYPE"]).lower()]
+
+        return 0, keys
+
+    def _pttl(self, name: str) -> int:
+        name = _str(name)
+        if not self._alive(name):
+            return -2
+        if name not in self.expires:
+            return -1
+        return max(int(self.expires[name] - time() * 1000), 0)
+
+    def _ttl(self, name: str) -> int:
+        ttl = self._pttl(name)
+        return ttl if ttl < 0 else (ttl + 999) // 1000
+
+    def _pexpireat(self, name: str, when: Any) -> bool:
+        name = _str(name)
+        if not self._alive(name):
+            return False
+
+        self.expires[name] = int(when)
+        self._log("PEXPIREAT", name, int(when))
+        return True
+
+    def _persist(self, name: str) -> bool:
+        name = _str(name)
+        if self._alive(name) and self.expires.pop(name, None) is not None:
+            self._log("PERSIST", name)
+            return True
+        return False
+
+    """ ###############
+         Simple Values
+        ############### """
+
+    def _get(self, name: str) -> Optional[str]:
+        return self._read(name, str, None)
+
+    def _set(self, name: str, value: Any, *args: Any) -> Any:
+        name = _str(name)
+        flags = [_str(a).upper() for a in args]
+
+        existed = self._alive(name)
+        if ("NX" in flags and existed) or ("XX" in flags and not existed):
+            return None
+
+        old = self._get(name) if "GET" in flags else None
+
+        expiry = None
+        for flag, factor, absolute in (("EX", 1000, False), ("PX", 1, False), ("EXAT", 1000, True), ("PXAT", 1, True)):
+            if flag in flags:
+                amount = int(flags[flags.index(flag) + 1]) * factor
+                expiry = amount if absolute else int(time() * 1000) + amount
+
+        self.data[name] = _str(value)
+        self._log("SET", name, value)
+
+        if expiry is not None:
+            self._pexpireat(name, expiry)
+        elif "KEEPTTL" not in flags:
+            self.expires.pop(name, None)
+
+        return old if "GET" in flags else True
+
+    def _incrby(self, name: str, amount: Any) -> int:
+        value = int(self._read(name, str, "0")) + int(amount)
+        self.data[_str(name)] = str(value)
+        self._log("INCRBY", name, amount)
+        return value
+
+    """ ######
+         Sets
+        ###### """
+
+    def _sadd(self, name: str, *values: Any) -> int:
+        members = self._write(name, set)
+        before = len(members)
+        members.update(map(_str, values))
+        self._log("SADD", name, *values)
+        return len(members) - before
+
+    def _srem(self, name: str, *values: Any) -> int:
+        members = self._read(name, set, set())
+        before = len(members)
+        members.difference_update(map(_str, values))
+        removed = before - len(members)
+
+        if removed:
+            self._cleanup(_str(name))
+            self._log("SREM", name, *values)
+
+        return removed
+
+    """ #######
+         Lists
+        ####### """
+
+    def _lpush(self, name: str, *values: Any) -> int:
+        items = self._write(name, list)
+        for value in values:
+            items.insert(0, _str(value))
+        self._log("LPUSH", name, *values)
+        return len(items)
+
+    def _rpush(self, name: str, *values: Any) -> int:
+        items = self._write(name, list)
+        items.extend(map(_str, values))
+        self._log("RPUSH", name, *values)
+        return len(items)
+
+    def _lrange(self, name: str, start: Any, end: Any) -> List[str]:
+        items = self._read(name, list, list())
+        size = len(items)
+
+        start, end = int(start), int(end)
+        start = max(size + start, 0) if start < 0 else start
+        end = size + end if end < 0 else min(end, size - 1)
+
+        return items[start:end + 1] if start <= end else list()
+
+    def _lrem(self, name: str, count: Any, value: Any) -> int:
+        items = self._read(name, list, list())
+        count, value = int(count), _str(value)
+
+        indexes = [i for i, item in enumerate(items) if item == value]
+        if count > 0:
+            indexes = indexes[:count]
+        elif count < 0:
+            indexes = indexes[count:]
+
+        for i in reversed(indexes):
+            del items[i]
+
+        if indexes:
+            self._cleanup(_str(name))
+            self._log("LREM", name, count, value)
+
+        return len(indexes)
+
+    def _lindex(self, name: str, index: Any) -> Optional[str]:
+        items = self._read(name, list, list())
+        try:
+            return items[int(index)]
+        except IndexError:
+            return None
+
+    """ ########
+         Hashes
+        ######## """
+
+    def _hset(self, name: str, *items: Any) -> int:
+        mapping = self._write(name, dict)
+        added = 0
+
+        for key, value in zip(items[::2], items[1::2]):
+            key = _str(key)
+            added += key not in mapping
+            mapping[key] = _str(value)
+
+        self._log("HSET", name, *items)
+        return added
+
+    def _hmset(self, name: str, *items: Any) -> bool:
+        self._hset(name, *items)
+        return True
+
+    def _hsetnx(self, name: str, key: Any, value: Any) -> int:
+        if _str(key) in self._read(name, dict, dict()):
+            return 0
+        return self._hset(name, key, value)
+
+    def _hdel(self, name: str, *keys: Any) -> int:
+        mapping = self._read(name, dict, dict())
+        removed = sum(1 for key in map(_str, keys) if mapping.pop(key, None) is not None)
+
+        if removed:
+            self._cleanup(_str(name))
+            self._log("HDEL", name, *keys)
+
+        return removed
+
+    def _hincrby(self, name: str, key: Any, amount: Any) -> int:
+        mapping = self._write(name, dict)
+        value = int(mapping.get(_str(key), 0)) + int(amount)
+        mapping[_str(key)] = str(value)
+        self._log("HSET", name, key, value)
+        return value
+
+    """ #########
+         Scripts
+        ######### """
+
+    def _evalsha(self, sha: str, numkeys: Any, *keys_and_args: Any) -> Any:
+        """Run the Python ``local`` of a registered script in place of its Lua"""
+
+        script = RedisScript.registry.get(_str(sha))
+        if script is None or script.local is None:
+            raise NoScriptError("No matching script. Please use EVAL.")
+
+        numkeys = int(numkeys)
+        keys = [_str(key) for key in keys_and_args[:numkeys]]
+        args = [_str(arg) for arg in keys_and_args[numkeys:]]
+
+        # Writes made by the script are logged as the commands it runs
+        return script.local(ScriptClient(self), keys, args)
+
+    """ #############
+         Sorted Sets
+        ############# """
+
+    def _zadd(self, name: str, *args: Any) -> int:
+        flags = set()
+        args = list(args)
+        while args and _str(args[0]).upper() in ("NX", "XX", "GT", "LT", "CH", "INCR"):
+            flags.add(_str(args.pop(0)).upper())
+
+        members = self._write(name, ZSet)
+        changed = 0
+        applied = list()
+
+        for score, member in zip(args[::2], args[1::2]):
+            member, score = _str(member), float(score)
+            exists_ = member in members
+
+            if "INCR" in flags:
+                score += members.get(member, 0.0)
+
+            if ("NX" in flags and exists_) or ("XX" in flags and not exists_):
+                continue
+            if exists_ and (("GT" in flags and score <= members[member]) or ("LT" in flags and score >= members[member])):
+                continue
+
+            if not exists_ or ("CH" in flags and members[member] != score):
+                changed += 1
+
+            members[member] = score
+            applied.extend((score, member))
+
+        self._cleanup(_str(name))
+
+        # Logged as the resulting scores so replay does not depend on flags
+        if applied:
+            self._log("ZADD", name, *applied)
+
+        if "INCR" in flags:
+            return applied[0] if applied else None
+
+        return changed
+
+    def _zrange(self, name: str, start: Any, end: Any, *args: Any, withscores: bool = False,
+                score_cast_func: Callable = float, **options) -> List[Any]:
+        members = self._read(name, ZSet, ZSet())
+        flags = [_str(a).upper() for a in args]
+
+        ordered = sorted(members.items(), key=lambda i: (i[1], i[0]), reverse="REV" in flags)
+        size = len(ordered)
+
+        start, end = int(start), int(end)
+        start = max(size + start, 0) if start < 0 else start
+        end = size + end if end < 0 else min(end, size - 1)
+        ordered = ordered[start:end + 1] if start <= end else list()
+
+        if withscores:
+            return [(member, score_cast_func(score)) for member, score in ordered]
+        return [member for member, _ in ordered]
+
+    def _zrem(self, name: str, *members: Any) -> int:
+        zset = self._read(name, ZSet, ZSet())
+        removed = sum(1 for member in map(_str, members) if zset.pop(member, None) is not None)
+
+        if removed:
+            self._cleanup(_str(name))
+            self._log("ZREM", name, *members)
+
+        return removed
+
+
+class ScriptClient(DataAccessCommands):
+    """Undecoded access to a MemoryStore, passed to the ``local`` of scripts
+
+    Replies are what Lua would see, so ``local`` can mirror it exactly"""
+
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def execute_command(self, *args, **options):
+        return self.store.execute(args, options)
+
+
+class MemoryRedis(RedisClient, DataAccessCommands, ScriptCommands):
+    """Redis client facade over a MemoryStore"""
+
+    # Command, extra args and optional cast used to fetch each data type
+    dump_types = Redis.dump_types
+
+    iter_dump = Redis.iter_dump
+    _dump_batch = Redis._dump_batch
+    to_dict = Redis.to_dict
+
+    def __init__(self, store: MemoryStore, schema: RedisSchema = None):
+        self.store = store
+        self._init_client(schema)
+
+    def execute_command(self, *args, **options):
+        return self._run_command(self._store_command, *args, **options)
+
+    def _store_command(self, *args, **options):
+        return self.store.execute(args, options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str = None) -> MemoryPipeline:
+        return MemoryPipeline(self)
+
+
+class MemoryPipeline(DataAccessCommands, ScriptCommands):
+    """Queues commands for a MemoryRedis
+
+    Queued commands run back to back when executed, so the
+    pipeline is always atomic, transaction or not."""
+
+    def __init__(self, client: MemoryRedis):
+        self.client = client
+        self.command_stack: List[Tuple[Tuple, Dict[str, Any]]] = list()
+
+    def __enter__(self) -> MemoryPipeline:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    def reset(self) -> None:
+        self.command_stack = list()
+
+    def execute_command(self, *args, **options) -> MemoryPipeline:
+        self.command_stack.append((args, options))
+        return self
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        stack, self.command_stack = self.command_stack, list()
+
+        ret = list()
+        for args, options in stack:
+            try:
+                ret.append(self.client.execute_command(*args, **options))
+            except ResponseError as error:
+                if raise_on_error:
+                    raise
+                ret.append(error)
+
+        return ret
+
+
+class AsyncMemoryRedis(AsyncRedisClient, AsyncDataAccessCommands, AsyncScriptCommands):
+    """asyncio Redis client facade over a MemoryStore
+
+    Commands complete without yielding to the event loop"""
+
+    # Command, extra args and optional cast used to fetch each data type
+    dump_types = Redis.dump_types
+
+    iter_dump = AsyncRedis.iter_dump
+    _dump_batch = AsyncRedis._dump_batch
+    to_dict = AsyncRedis.to_dict
+
+    def __init__(self, store: MemoryStore, schema: RedisSchema = None):
+        self.store = store
+        self._init_client(schema)
+
+    async def execute_command(self, *args, **options):
+        return await self._run_command(self._store_command, *args, **options)
+
+    async def _store_command(self, *args, **options):
+        return self.store.execute(args, options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str = None) -> AsyncMemoryPipeline:
+        return AsyncMemoryPipeline(self)
+
+
+class AsyncMemoryPipeline(DataAccessCommands, ScriptCommands):
+    """Queues commands for an AsyncMemoryRedis"""
+
+    def __init__(self, client: AsyncMemoryRedis):
+        self.client = client
+        self.command_stack: List[Tuple[Tuple, Dict[str, Any]]] = list()
+
+    async def __aenter__(self) -> AsyncMemoryPipeline:
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    def reset(self) -> None:
+        self.command_stack = list()
+
+    def execute_command(self, *args, **options) -> AsyncMemoryPipeline:
+        self.command_stack.append((args, options))
+        return self
+
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        stack, self.command_stack = self.command_stack, list()
+
+        ret = list()
+        for args, options in stack:
+            try:
+                ret.append(await self.client.execute_command(*args, **options))
+            except ResponseError as error:
+                if raise_on_error:
+                    raise
+                ret.append(error)
+
+        return ret